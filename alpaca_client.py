@@ -0,0 +1,134 @@
+"""
+Shared Alpaca API configuration and HTTP session.
+
+config.yml is parsed once at import; scripts use SESSION (auth headers
+already set, pooled keep-alive connections) instead of building headers
+for every request.
+"""
+import calendar
+import math
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import yaml
+
+from database import BarRow
+from rate_limit import trading_limiter
+
+# Load config
+with open('config.yml', 'r') as f:
+    config = yaml.safe_load(f)
+
+BASE_URL = config['alpaca']['data_url']
+TRADING_URL = config['alpaca']['trading_url']
+# Market data feed: 'iex' (free) or 'sip' (full consolidated tape, needs entitlement)
+FEED = config['alpaca'].get('feed', 'iex')
+
+HEADERS = {
+    'APCA-API-KEY-ID': config['alpaca']['api_key'],
+    'APCA-API-SECRET-KEY': config['alpaca']['api_secret']
+}
+
+# Keep-alive connection pool sized for concurrent fetchers. 429 and transient
+# 5xx responses are retried with backoff, honoring Retry-After; once retries
+# run out the last response is returned so callers can inspect the status.
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount('https://', HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=16,
+    max_retries=Retry(
+        total=3,
+        status_forcelist=[429, 502, 503, 504],
+        backoff_factor=0.5,
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+))
+
+def retry_after_seconds(response, default: float = 1.0) -> float:
+    """
+    Seconds to wait from a 429's Retry-After header, which may be a number of
+    seconds or an HTTP-date (RFC 9110). Falls back to `default` when the
+    header is missing or unparseable, so callers can always back off; it
+    never raises.
+    """
+    value = response.headers.get('Retry-After')
+    if not value:
+        return default
+    try:
+        seconds = float(value)
+    except ValueError:
+        pass
+    else:
+        # 'inf' would make time.sleep() raise instead of backing off
+        return max(0.0, seconds) if math.isfinite(seconds) else default
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def fetch_all_assets(asset_class: str = 'us_equity') -> Dict[str, Dict]:
+    """
+    Fetch every asset of a class (active and inactive) from the trading API's
+    list endpoint in one request and return symbol -> asset dict. Symbols
+    missing from the result are unknown to Alpaca (delisted).
+    """
+    trading_limiter.acquire()
+    response = SESSION.get(f'{TRADING_URL}/assets', params={'asset_class': asset_class}, timeout=(3, 60))
+    response.raise_for_status()
+    return {asset['symbol']: asset for asset in response.json()}
+
+
+@lru_cache(maxsize=65536)
+def parse_bar_timestamp(t: str) -> int:
+    """
+    Convert an Alpaca bar time ('2024-01-15T14:30:00Z') to Unix seconds.
+    Alpaca always returns this fixed UTC layout, so slice the fields directly
+    rather than going through datetime.fromisoformat().
+
+    Multi-symbol payloads repeat the same bar times for every symbol, so
+    results are memoized and each distinct string is parsed only once.
+    """
+    return calendar.timegm((int(t[0:4]), int(t[5:7]), int(t[8:10]),
+                            int(t[11:13]), int(t[14:16]), int(t[17:19]), 0, 0, 0))
+
+
+def normalize_bars(symbol: str, timeframe: str, bars: Iterable[Dict]) -> Iterator[BarRow]:
+    """
+    Convert raw Alpaca bar objects into positional rows in database.BAR_COLUMNS
+    order. This is the single place per-bar conversion happens, so any derived
+    columns or a compiled kernel over column arrays can be added here without
+    touching the fetchers or the DB layer.
+    """
+    for bar in bars:
+        yield (
+            symbol,
+            timeframe,
+            parse_bar_timestamp(bar['t']),
+            float(bar['o']),
+            float(bar['h']),
+            float(bar['l']),
+            float(bar['c']),
+            int(bar['v'])
+        )
+
+
+def normalize_tagged_bars(timeframe: str, bars: Iterable[Dict]) -> Iterator[BarRow]:
+    """
+    Like normalize_bars, for payloads where each bar carries its own symbol
+    ('S', or 'Symbol' in older responses). Bars without one are skipped.
+    """
+    for bar in bars:
+        symbol = bar.get('S') or bar.get('Symbol')
+        if symbol:
+            yield from normalize_bars(symbol, timeframe, (bar,))
@@ -0,0 +1,118 @@
+"""
+Background writer that drains fetched bar rows from a queue into SQLite.
+
+Fetch loops put() rows and move straight on to the next HTTP request while
+one thread accumulates rows and writes them with insert_bars_batch, so
+network and disk I/O overlap and SQLite only ever sees a single writer.
+The writer keeps one connection open and commits each flush as a single
+transaction.
+"""
+import queue
+import threading
+from typing import Callable, List, Optional, Sequence
+
+from database import get_connection, insert_bars_batch, BarRow
+
+_SENTINEL = object()
+
+
+class BarWriter:
+    """
+    Single writer thread that batches queued bar rows into the database.
+
+    Usage:
+        with BarWriter() as writer:
+            for symbol in symbols:
+                writer.put(fetch_bars(...))
+        print(writer.inserted)
+
+    close() (and so leaving the with block) raises RuntimeError if any batch
+    failed to insert; the writer keeps draining the queue until then so
+    put() never blocks on a dead thread.
+    """
+
+    def __init__(self, flush_rows: int = 10000, maxsize: int = 64,
+                 on_insert: Optional[Callable[[int], None]] = None):
+        """
+        Args:
+            flush_rows: Write once this many rows have accumulated
+            maxsize: Max queued batches before put() blocks (backpressure)
+            on_insert: Called from the writer thread with each batch's inserted row count
+        """
+        self.flush_rows = flush_rows
+        self.on_insert = on_insert
+        self.inserted = 0
+        self.failed = 0
+        self._error: Optional[BaseException] = None
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(target=self._run, name='bar_writer', daemon=True)
+
+    def start(self) -> 'BarWriter':
+        self._thread.start()
+        return self
+
+    def put(self, rows: Sequence[BarRow]):
+        """Queue rows for insertion (blocks while the queue is full)"""
+        if rows:
+            self._queue.put(rows)
+
+    def close(self) -> int:
+        """
+        Flush everything still queued, stop the thread and return rows inserted.
+        Raises RuntimeError (chained to the first insert error) if any rows failed.
+        """
+        self._queue.put(_SENTINEL)
+        self._thread.join()
+        if self._error is not None:
+            raise RuntimeError(f"Bar writer failed to insert {self.failed:,} rows") from self._error
+        return self.inserted
+
+    def _flush(self, conn, buf: List[BarRow]):
+        if not buf:
+            return
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            inserted = insert_bars_batch(buf, conn=conn) or 0
+            conn.commit()
+        except Exception as e:
+            print(f"Bar writer error: {e}")
+            conn.rollback()
+            self.failed += len(buf)
+            if self._error is None:
+                self._error = e
+            return
+        self.inserted += inserted
+        if inserted and self.on_insert:
+            try:
+                self.on_insert(inserted)
+            except Exception as e:
+                print(f"Bar writer callback error: {e}")
+
+    def _run(self):
+        # get_connection() already sets WAL, NORMAL sync and a large page cache
+        conn = get_connection()
+        buf: List[BarRow] = []
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _SENTINEL:
+                    self._flush(conn, buf)
+                    return
+                buf.extend(item)
+                if len(buf) >= self.flush_rows:
+                    self._flush(conn, buf)
+                    buf = []
+        finally:
+            conn.close()
+
+    def __enter__(self) -> 'BarWriter':
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.close()
+        except RuntimeError:
+            # Don't mask an exception already propagating out of the with block
+            if exc_type is None:
+                raise
+        return False
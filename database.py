@@ -2,17 +2,56 @@
 Database layer for storing historical stock bar data.
 Supports multiple timeframes (1s, 1m, etc.) for NYSE stocks.
 """
+import hashlib
+import json
 import sqlite3
+import sys
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Sequence, Union, Iterable, Iterator
 import os
 
 DB_PATH = 'stonxx.db'
 
+# Column order of positional bar rows accepted by insert_bars_batch
+BAR_COLUMNS = ('symbol', 'timeframe', 'timestamp', 'open', 'high', 'low', 'close', 'volume')
+BarRow = Tuple[str, str, int, float, float, float, float, int]
+
+# Asset metadata cache for tradability checks (created lazily by the helpers too,
+# since cleanup scripts don't run init_database)
+ASSET_CACHE_DDL = '''
+    CREATE TABLE IF NOT EXISTS asset_cache (
+        symbol TEXT PRIMARY KEY,
+        status TEXT NOT NULL,                -- Alpaca status, or 'not_found' for a 404
+        tradable INTEGER NOT NULL,
+        asset_class TEXT,
+        checked_at INTEGER NOT NULL DEFAULT (strftime('%s','now'))
+    )
+'''
+
+# Rows per executemany() call in insert_bars_batch
+INSERT_CHUNK_ROWS = 10000
+# Per-connection page cache, in KiB when negative (256MB)
+CACHE_SIZE = -262144
+# Bytes of the database file read through a memory map instead of read() (1GB)
+MMAP_SIZE = 1 << 30
+
 def get_connection():
-    """Get database connection"""
+    """
+    Get database connection.
+
+    WAL lets readers keep going while a cleanup script deletes or a writer
+    commits, and NORMAL sync only fsyncs at checkpoints. The larger page cache,
+    memory map and in-memory temp store keep the full-table scans and GROUP BYs
+    in the analysis scripts off the disk.
+    """
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA cache_size={CACHE_SIZE}')
+    conn.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+    conn.execute('PRAGMA temp_store=MEMORY')
     return conn
 
 def init_database():
@@ -53,6 +92,13 @@ def init_database():
         ON bars(symbol)
     ''')
 
+    # Timeframe-first covering index: per-timeframe MAX(timestamp) GROUP BY symbol
+    # is answered from index leaves without touching table rows
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_bars_tf_sym_ts
+        ON bars(timeframe, symbol, timestamp DESC)
+    ''')
+
     # Ratings table - stores a single 0-5 star rating per symbol
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS symbol_ratings (
@@ -62,6 +108,9 @@ def init_database():
         )
     ''')
 
+    # Asset cache table - Alpaca asset metadata from tradability checks
+    cursor.execute(ASSET_CACHE_DDL)
+
     # Ingest runs table - tracks background/on-demand ingest processes
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS ingest_runs (
@@ -108,23 +157,44 @@ def insert_bar(symbol: str, timeframe: str, timestamp: int,
     finally:
         conn.close()
 
-def insert_bars_batch(bars: List[Dict]):
-    """Insert multiple bars in a batch transaction"""
+def insert_bars_batch(bars: Sequence[Union[BarRow, Dict]], conn: Optional[sqlite3.Connection] = None):
+    """
+    Insert multiple bars in a batch transaction.
+
+    Rows are positional tuples in BAR_COLUMNS order; dict rows are still
+    accepted and converted for older callers.
+
+    Rows are written with executemany() in INSERT_CHUNK_ROWS chunks, all
+    inside one transaction.
+
+    If `conn` is given, rows are inserted on that connection without
+    committing or closing it, so several batches can share one transaction;
+    errors propagate to the caller, which owns the transaction.
+    """
+    if bars and isinstance(bars[0], dict):
+        bars = [tuple(bar[col] for col in BAR_COLUMNS) for bar in bars]
+
+    sql = '''
+        INSERT OR IGNORE INTO bars 
+        (symbol, timeframe, timestamp, open, high, low, close, volume)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+
+    def _insert_chunks(conn) -> int:
+        inserted = 0
+        for i in range(0, len(bars), INSERT_CHUNK_ROWS):
+            inserted += conn.executemany(sql, bars[i:i + INSERT_CHUNK_ROWS]).rowcount
+        return inserted
+
+    if conn is not None:
+        return _insert_chunks(conn)
+
     conn = get_connection()
-    cursor = conn.cursor()
     
     try:
-        cursor.executemany('''
-            INSERT OR IGNORE INTO bars 
-            (symbol, timeframe, timestamp, open, high, low, close, volume)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', [
-            (bar['symbol'], bar['timeframe'], bar['timestamp'], 
-             bar['open'], bar['high'], bar['low'], bar['close'], bar['volume'])
-            for bar in bars
-        ])
+        inserted = _insert_chunks(conn)
         conn.commit()
-        return cursor.rowcount
+        return inserted
     except Exception as e:
         print(f"Error inserting bars batch: {e}")
         conn.rollback()
@@ -136,7 +206,7 @@ def get_bars(symbol: str, timeframe: str,
              start_time: Optional[int] = None, 
              end_time: Optional[int] = None,
              limit: Optional[int] = None) -> List[Dict]:
-    """Get bars for a symbol and timeframe"""
+    """Get bars for a symbol and timeframe, oldest first"""
     conn = get_connection()
     cursor = conn.cursor()
     
@@ -155,6 +225,7 @@ def get_bars(symbol: str, timeframe: str,
         query += ' AND timestamp <= ?'
         params.append(end_time)
     
+    # Rows come back in idx_bars_symbol_timeframe order, so callers never need to re-sort
     query += ' ORDER BY timestamp ASC'
     
     if limit:
@@ -185,11 +256,93 @@ def get_latest_bar(symbol: str, timeframe: str) -> Optional[Dict]:
     
     return dict(row) if row else None
 
-def get_symbols_with_data(timeframe: str) -> List[str]:
-    """Get list of symbols that have data for a given timeframe"""
+def get_latest_closes(timeframe: str) -> Dict[str, float]:
+    """Get the most recent close for every symbol in a timeframe with one query"""
     conn = get_connection()
     cursor = conn.cursor()
     
+    # MAX(timestamp) per symbol comes straight off the index; each latest row
+    # is then one primary-key seek, with no window sort over the whole timeframe
+    cursor.execute('''
+        SELECT b.symbol, b.close
+        FROM bars b
+        JOIN (
+            SELECT symbol, MAX(timestamp) AS timestamp
+            FROM bars
+            WHERE timeframe = ?
+            GROUP BY symbol
+        ) latest ON b.symbol = latest.symbol AND b.timestamp = latest.timestamp
+        WHERE b.timeframe = ?
+    ''', (timeframe, timeframe))
+    
+    result = {row[0]: row[1] for row in cursor.fetchall()}
+    conn.close()
+    
+    return result
+
+def cache_dir() -> str:
+    """Private .cache directory next to the database file (created on demand)"""
+    path = os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), '.cache')
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    return path
+
+def db_cache_path(kind: str, suffix: str) -> str:
+    """
+    Path of a JSON cache file in cache_dir() for this database; the file name
+    carries a hash of DB_PATH so several databases in one directory don't
+    share entries.
+    """
+    db_id = hashlib.sha1(os.path.abspath(DB_PATH).encode()).hexdigest()[:12]
+    return os.path.join(cache_dir(), f'{kind}_{db_id}_{suffix}.json')
+
+def _symbols_cache_path(timeframe: str) -> str:
+    return db_cache_path('symbols', timeframe)
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size) of a file, or None if it is missing or empty"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size) if st.st_size else None
+
+def db_file_signature() -> Tuple:
+    """
+    Change marker for the database files, for keying on-disk caches. Every
+    connection re-creates an empty -wal file, so the WAL only counts once it
+    holds frames; after a checkpoint the change shows up on the main file.
+    """
+    return (_file_signature(DB_PATH), _file_signature(DB_PATH + '-wal'))
+
+def get_symbols_with_data(timeframe: str, as_set: bool = False) -> Union[List[str], frozenset]:
+    """
+    Get list of symbols that have data for a given timeframe.
+
+    With as_set=True, return an uppercased frozenset of interned strings instead,
+    for callers that only test membership or intersect against a symbol list.
+
+    The list is cached as JSON in cache_dir(), keyed by MAX(rowid) of bars and
+    db_file_signature(), so repeated script starts skip the DISTINCT scan until
+    the table changes.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('SELECT MAX(rowid) FROM bars')
+    cache_key = repr((cursor.fetchone()[0], db_file_signature()))
+    try:
+        cache_path = _symbols_cache_path(timeframe)
+        with open(cache_path, 'r') as f:
+            cached = json.load(f)
+        if cached['key'] == cache_key:
+            conn.close()
+            symbols = cached['symbols']
+            if as_set:
+                return frozenset(sys.intern(s.upper()) for s in symbols)
+            return symbols
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    
     cursor.execute('''
         SELECT DISTINCT symbol
         FROM bars
@@ -200,8 +353,51 @@ def get_symbols_with_data(timeframe: str) -> List[str]:
     symbols = [row[0] for row in cursor.fetchall()]
     conn.close()
     
+    try:
+        cache_path = _symbols_cache_path(timeframe)
+        tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'key': cache_key, 'symbols': symbols}, f)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+    
+    if as_set:
+        return frozenset(sys.intern(s.upper()) for s in symbols)
     return symbols
 
+def find_symbols_with_data(candidates: Iterable[str], timeframe: str,
+                           conn: Optional[sqlite3.Connection] = None) -> List[str]:
+    """
+    Return which of `candidates` (uppercased) have data for a timeframe, sorted.
+
+    The candidates are loaded into a temp table and joined against bars, so
+    each one is an index seek and the full symbol list never leaves SQLite.
+    With `conn`, the temp table work is committed on that connection.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_connection()
+    try:
+        conn.execute('CREATE TEMP TABLE IF NOT EXISTS symbol_targets (symbol TEXT PRIMARY KEY)')
+        conn.execute('DELETE FROM symbol_targets')
+        conn.executemany('INSERT OR IGNORE INTO symbol_targets (symbol) VALUES (?)',
+                         ((s.upper(),) for s in candidates))
+        rows = conn.execute('''
+            SELECT t.symbol
+            FROM symbol_targets t
+            WHERE EXISTS (
+                SELECT 1 FROM bars b WHERE b.symbol = t.symbol AND b.timeframe = ?
+            )
+            ORDER BY t.symbol
+        ''', (timeframe,)).fetchall()
+        conn.execute('DROP TABLE symbol_targets')
+        conn.commit()
+        return [row[0] for row in rows]
+    finally:
+        if own_conn:
+            conn.close()
+
 def get_data_range(symbol: str, timeframe: str) -> Optional[Tuple[int, int]]:
     """Get the earliest and latest timestamps for a symbol/timeframe"""
     conn = get_connection()
@@ -220,6 +416,48 @@ def get_data_range(symbol: str, timeframe: str) -> Optional[Tuple[int, int]]:
         return (row[0], row[1])
     return None
 
+def get_coverage_summary(timeframe: str, start_time: int, end_time: int) -> Dict[str, Tuple[int, int, int]]:
+    """
+    Return symbol -> (min_ts, max_ts, bar_count) for every symbol with bars of
+    a timeframe, computed in a single aggregate query. min_ts/max_ts span all
+    of the symbol's bars (like get_data_range); bar_count counts only bars
+    within [start_time, end_time] and may be 0.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        SELECT symbol, MIN(timestamp), MAX(timestamp),
+               SUM(timestamp BETWEEN ? AND ?)
+        FROM bars
+        WHERE timeframe = ?
+        GROUP BY symbol
+    ''', (start_time, end_time, timeframe))
+    
+    summary = {row[0]: (row[1], row[2], row[3]) for row in cursor.fetchall()}
+    conn.close()
+    
+    return summary
+
+def iter_symbol_timestamps(timeframe: str, start_time: int, end_time: int) -> Iterator[Tuple[str, int]]:
+    """
+    Yield (symbol, timestamp) for bars of a timeframe within [start_time, end_time],
+    ordered by symbol then timestamp. Rows are streamed from the cursor, so
+    callers can group them with itertools.groupby without loading everything.
+    """
+    conn = get_connection()
+    try:
+        cursor = conn.execute('''
+            SELECT symbol, timestamp
+            FROM bars
+            WHERE timeframe = ? AND timestamp BETWEEN ? AND ?
+            ORDER BY symbol, timestamp
+        ''', (timeframe, start_time, end_time))
+        for row in cursor:
+            yield row[0], row[1]
+    finally:
+        conn.close()
+
 def get_bar_count(symbol: Optional[str] = None, timeframe: Optional[str] = None) -> int:
     """Get total count of bars, optionally filtered by symbol and/or timeframe"""
     conn = get_connection()
@@ -260,6 +498,132 @@ def delete_old_bars(days_to_keep: int = 90):
     
     return deleted
 
+def delete_symbols(symbols: Sequence[str], conn: Optional[sqlite3.Connection] = None,
+                   chunk_size: int = 500) -> int:
+    """
+    Delete all bars for the given symbols with IN-clause statements of
+    `chunk_size` symbols (under SQLite's 999 bound-parameter limit), all in
+    one transaction. Returns the number of bar rows deleted.
+
+    If `conn` is given, the deletes run on it without committing or closing,
+    and the caller owns the transaction.
+    """
+    def _delete_chunks(conn) -> int:
+        deleted = 0
+        for i in range(0, len(symbols), chunk_size):
+            chunk = list(symbols[i:i + chunk_size])
+            placeholders = ','.join('?' * len(chunk))
+            deleted += conn.execute(f'DELETE FROM bars WHERE symbol IN ({placeholders})', chunk).rowcount
+        return deleted
+
+    if conn is not None:
+        return _delete_chunks(conn)
+
+    conn = get_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        deleted = _delete_chunks(conn)
+        conn.commit()
+        return deleted
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+@contextmanager
+def bulk_write(conn: sqlite3.Connection):
+    """
+    Run a large write (e.g. delete_symbols) as one BEGIN IMMEDIATE transaction.
+
+    WAL autocheckpointing is paused for the duration so the log isn't copied
+    back into the database mid-write; after commit one TRUNCATE checkpoint
+    folds it in and resets the WAL file. Rolls back if the block raises.
+
+    Usage:
+        with bulk_write(conn):
+            removed = delete_symbols(symbols, conn=conn)
+    """
+    autocheckpoint = conn.execute('PRAGMA wal_autocheckpoint').fetchone()[0]
+    conn.execute('PRAGMA wal_autocheckpoint=0')
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    finally:
+        conn.execute(f'PRAGMA wal_autocheckpoint={autocheckpoint}')
+
+def optimize_database(conn: sqlite3.Connection, vacuum: bool = False) -> int:
+    """
+    Refresh planner statistics after a large delete (PRAGMA optimize) and, if
+    `vacuum`, rebuild the file so the freed pages are returned to the OS.
+    Call outside a transaction. Returns the bytes reclaimed (0 without vacuum).
+    """
+    conn.execute('PRAGMA optimize')
+    if not vacuum:
+        return 0
+
+    def _db_size() -> int:
+        return conn.execute('PRAGMA page_count').fetchone()[0] * conn.execute('PRAGMA page_size').fetchone()[0]
+
+    before = _db_size()
+    conn.execute('VACUUM')
+    # In WAL mode the rebuilt pages land in the log first; fold them in so the file shrinks
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    return before - _db_size()
+
+def ensure_bar_indexes(conn: Optional[sqlite3.Connection] = None):
+    """
+    Make sure the symbol-leading bar indexes exist and that the query planner
+    has statistics for them (ANALYZE runs only if bars was never analyzed).
+    Cleanup and validation scripts call this before deleting or reading by
+    symbol, since they don't run init_database. Cheap no-op once both are in
+    place.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_connection()
+    try:
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_bars_symbol_timeframe
+            ON bars(symbol, timeframe, timestamp)
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_bars_symbol
+            ON bars(symbol)
+        ''')
+        has_stats = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+        ).fetchone()
+        if not has_stats or not conn.execute("SELECT 1 FROM sqlite_stat1 WHERE tbl = 'bars' LIMIT 1").fetchone():
+            conn.execute('ANALYZE bars')
+        conn.commit()
+    finally:
+        if own_conn:
+            conn.close()
+
+def remove_symbols(conn: sqlite3.Connection, symbols: Sequence[str],
+                   vacuum: bool = False) -> Tuple[int, int]:
+    """
+    Delete every bar for `symbols` and tidy up afterwards; the shared tail of
+    the cleanup scripts. Returns (rows_removed, bytes_reclaimed), where
+    bytes_reclaimed is 0 unless `vacuum`.
+    """
+    # Symbol index + planner stats so each IN chunk is an index seek, not a table scan
+    ensure_bar_indexes(conn)
+    # Chunked IN-clause deletes in a single write transaction; WAL is checkpointed once at the end
+    with bulk_write(conn):
+        removed = delete_symbols(symbols, conn=conn)
+    # Refresh planner stats after the delete; vacuum also shrinks the file
+    # (VACUUM rewrites the database, so it needs free disk about the DB's size)
+    reclaimed = optimize_database(conn, vacuum=vacuum)
+    return removed, reclaimed
+
 def create_ingest_run(timeframe: str, mode: str, window_start: int, window_end: int, pid: int) -> int:
     """Create an ingest run record and return its ID"""
     conn = get_connection()
@@ -401,6 +765,37 @@ def get_ratings_map() -> Dict[str, int]:
     conn.close()
     return out
 
+def get_asset_cache(max_age_seconds: int = 24 * 60 * 60) -> Dict[str, Dict]:
+    """Return symbol -> {status, tradable, asset_class} for entries checked within max_age_seconds."""
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(ASSET_CACHE_DDL)
+    cur.execute('''
+        SELECT symbol, status, tradable, asset_class
+        FROM asset_cache
+        WHERE checked_at > strftime('%s','now') - ?
+    ''', (max_age_seconds,))
+    out: Dict[str, Dict] = {
+        row[0]: {'status': row[1], 'tradable': bool(row[2]), 'asset_class': row[3]}
+        for row in cur.fetchall()
+    }
+    conn.close()
+    return out
+
+def save_asset_cache(assets: Dict[str, Dict]):
+    """Upsert symbol -> {status, tradable, asset_class} entries, stamped with the current time."""
+    if not assets:
+        return
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(ASSET_CACHE_DDL)
+    cur.executemany('''
+        INSERT OR REPLACE INTO asset_cache(symbol, status, tradable, asset_class, checked_at)
+        VALUES (?, ?, ?, ?, strftime('%s','now'))
+    ''', [(symbol, a['status'], int(bool(a['tradable'])), a['asset_class']) for symbol, a in assets.items()])
+    conn.commit()
+    conn.close()
+
 if __name__ == '__main__':
     # Initialize database when run directly
     init_database()
@@ -3,11 +3,12 @@ Fetch the last 8 weeks of 30-minute bars from Alpaca for symbols
 that already exist in the local database, and store them.
 """
 from datetime import datetime, timedelta
-import time
 from typing import List
 import os
 
-from database import init_database, insert_bars_batch, get_symbols_with_data, create_ingest_run, update_ingest_run
+from database import init_database, get_symbols_with_data, create_ingest_run, update_ingest_run
+from bar_writer import BarWriter
+from progress import Progress
 from fetch_historical_data import fetch_bars  # reuse existing Alpaca fetcher
 
 
@@ -34,7 +35,6 @@ def fetch_for_existing_symbols(days: int = 56, timeframe: str = '30Min') -> None
 	print(f"Fetching {timeframe} bars for {len(symbols)} symbols "
 	      f"from {start_dt.date()} to {end_dt.date()} ({days} days)")
 
-	total_new = 0
 	success = 0
 	fail = 0
 
@@ -47,28 +47,28 @@ def fetch_for_existing_symbols(days: int = 56, timeframe: str = '30Min') -> None
 		pid=os.getpid()
 	)
 
-	for i, symbol in enumerate(symbols, 1):
+	progress = Progress(len(symbols), desc=timeframe)
+	# Inserts run on a background thread while the next symbol is fetched
+	writer = BarWriter(on_insert=lambda n: update_ingest_run(run_id, inserted_rows_increment=n)).start()
+
+	for symbol in symbols:
 		try:
-			print(f"[{i}/{len(symbols)}] {symbol}: fetching...", end=' ', flush=True)
+			progress.update()
 			bars = fetch_bars(symbol, timeframe, start_dt, end_dt)
 			if not bars:
 				fail += 1
-				print("no data")
+				progress.write(f"{progress.prefix()} {symbol}: no data")
 				continue
 
-			inserted = insert_bars_batch(bars)
-			total_new += inserted
-			if inserted:
-				update_ingest_run(run_id, inserted_rows_increment=inserted)
+			writer.put(bars)
 			success += 1
-			print(f"{len(bars):,} bars ({inserted:,} new)")
-
-			# modest pacing
-			time.sleep(0.15)
+			progress.write(f"{progress.prefix()} {symbol}: {len(bars):,} bars")
 		except Exception as e:
 			fail += 1
-			print(f"error: {e}")
+			progress.write(f"{progress.prefix()} {symbol}: error: {e}")
 
+	progress.close()
+	total_new = writer.close()
 	print("\nDone.")
 	print(f"Symbols: {len(symbols)} | Success: {success} | Fail: {fail} | New rows: {total_new:,}")
 	# finish run
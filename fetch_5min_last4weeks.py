@@ -3,10 +3,11 @@ Fetch the last 4 weeks of 5-minute bars from Alpaca for symbols
 that already exist in the local database, and store them.
 """
 from datetime import datetime, timedelta
-import time
 from typing import List
 
-from database import init_database, insert_bars_batch, get_symbols_with_data
+from database import init_database, get_symbols_with_data
+from bar_writer import BarWriter
+from progress import Progress
 from fetch_historical_data import fetch_bars  # re-use existing Alpaca fetcher
 
 
@@ -33,30 +34,31 @@ def fetch_for_existing_symbols(days: int = 28, timeframe: str = '5Min') -> None:
 	print(f"Fetching {timeframe} bars for {len(symbols)} symbols "
 	      f"from {start_dt.date()} to {end_dt.date()} ({days} days)")
 
-	total_new = 0
 	success = 0
 	fail = 0
 
-	for i, symbol in enumerate(symbols, 1):
+	progress = Progress(len(symbols), desc=timeframe)
+	# Inserts run on a background thread while the next symbol is fetched
+	writer = BarWriter().start()
+
+	for symbol in symbols:
 		try:
-			print(f"[{i}/{len(symbols)}] {symbol}: fetching...", end=' ', flush=True)
+			progress.update()
 			bars = fetch_bars(symbol, timeframe, start_dt, end_dt)
 			if not bars:
 				fail += 1
-				print("no data")
+				progress.write(f"{progress.prefix()} {symbol}: no data")
 				continue
 
-			inserted = insert_bars_batch(bars)
-			total_new += inserted
+			writer.put(bars)
 			success += 1
-			print(f"{len(bars):,} bars ({inserted:,} new)")
-
-			# modest pacing
-			time.sleep(0.15)
+			progress.write(f"{progress.prefix()} {symbol}: {len(bars):,} bars")
 		except Exception as e:
 			fail += 1
-			print(f"error: {e}")
+			progress.write(f"{progress.prefix()} {symbol}: error: {e}")
 
+	progress.close()
+	total_new = writer.close()
 	print("\nDone.")
 	print(f"Symbols: {len(symbols)} | Success: {success} | Fail: {fail} | New rows: {total_new:,}")
 
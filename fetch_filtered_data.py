@@ -1,54 +1,22 @@
 """
 Fetch historical data for NYSE symbols that are between $1-$20 per share
 """
-from fetch_historical_data import fetch_bars
-from database import init_database, insert_bars_batch
-import requests
-import yaml
-
-# Load config
-with open('config.yml', 'r') as f:
-    config = yaml.safe_load(f)
-
-ALPACA_API_KEY = config['alpaca']['api_key']
-ALPACA_SECRET_KEY = config['alpaca']['api_secret']
-BASE_URL = config['alpaca']['data_url']
-TRADING_URL = config['alpaca']['trading_url']
-
-def get_headers():
-    return {
-        'APCA-API-KEY-ID': ALPACA_API_KEY,
-        'APCA-API-SECRET-KEY': ALPACA_SECRET_KEY
-    }
-
-def get_nyse_symbols():
-    """Fetch NYSE symbols from Alpaca API"""
-    headers = get_headers()
-    try:
-        url = f'{TRADING_URL}/assets'
-        response = requests.get(
-            url,
-            headers=headers,
-            params={'status': 'active', 'exchange': 'NYSE', 'asset_class': 'us_equity'}
-        )
-        if response.status_code == 200:
-            assets = response.json()
-            symbols = [asset['symbol'] for asset in assets if asset.get('status') == 'active']
-            return symbols
-        return []
-    except Exception as e:
-        print(f"Error fetching NYSE symbols: {e}")
-        return []
+from fetch_historical_data import fetch_bars, get_nyse_symbols
+from database import init_database
+from bar_writer import BarWriter
+from progress import Progress
+from alpaca_client import SESSION, BASE_URL
+from rate_limit import data_limiter
 from datetime import datetime, timedelta
 import time
 
 def get_current_price(symbol: str) -> float:
     """Get current price for a symbol from Alpaca API"""
-    headers = get_headers()
     try:
-        response = requests.get(
+        # Snapshots are a data API call, so they share the data_limiter budget
+        data_limiter.acquire()
+        response = SESSION.get(
             f'{BASE_URL}/stocks/snapshots',
-            headers=headers,
             params={'symbols': symbol}
         )
         if response.status_code == 200:
@@ -67,8 +35,7 @@ def filter_symbols_by_price(symbols: list, min_price: float = 1.0, max_price: fl
     print(f"Total symbols to check: {len(symbols):,}\n")
     
     filtered = []
-    checked = 0
-    start_time = time.time()
+    progress = Progress(len(symbols), desc='prices')
     
     # Process in chunks to check prices
     chunk_size = 100
@@ -77,15 +44,14 @@ def filter_symbols_by_price(symbols: list, min_price: float = 1.0, max_price: fl
     for i in range(0, len(symbols), chunk_size):
         chunk = symbols[i:i + chunk_size]
         chunk_num = (i // chunk_size) + 1
-        checked += len(chunk)
+        progress.update(len(chunk))
         
         # Get prices for chunk
         symbols_str = ','.join(chunk)
-        headers = get_headers()
         try:
-            response = requests.get(
+            data_limiter.acquire()
+            response = SESSION.get(
                 f'{BASE_URL}/stocks/snapshots',
-                headers=headers,
                 params={'symbols': symbols_str}
             )
             
@@ -99,25 +65,19 @@ def filter_symbols_by_price(symbols: list, min_price: float = 1.0, max_price: fl
                             filtered.append(symbol)
                             chunk_filtered += 1
                 
-                # Progress update with percentage
-                percent = (checked / len(symbols)) * 100
-                elapsed = time.time() - start_time
-                rate = checked / elapsed if elapsed > 0 else 0
-                remaining = (len(symbols) - checked) / rate if rate > 0 else 0
-                
-                print(f"[{chunk_num}/{total_chunks}] Checked {checked:,}/{len(symbols):,} symbols ({percent:.1f}%) | "
-                      f"Found: {len(filtered):,} in range | "
-                      f"Rate: {rate:.0f} symbols/sec | "
-                      f"ETA: {remaining:.0f}s", end='\r')
-            
-            time.sleep(0.1)  # Rate limiting
+                # Progress update (rendered at most once per second)
+                progress.status(f"[{chunk_num}/{total_chunks}] Checked {progress.count:,}/{len(symbols):,} symbols | "
+                                f"Found: {len(filtered):,} in range | "
+                                f"Rate: {progress.rate:.0f} symbols/sec | "
+                                f"ETA: {progress.eta:.0f}s")
             
         except Exception as e:
-            print(f"\n  Error checking chunk {chunk_num}: {e}")
+            progress.write(f"  Error checking chunk {chunk_num}: {e}")
             continue
     
-    elapsed_total = time.time() - start_time
-    print(f"\n{'='*60}")
+    progress.close()
+    elapsed_total = progress.elapsed
+    print(f"{'='*60}")
     print(f"✓ Filtering complete in {elapsed_total:.1f} seconds")
     print(f"✓ Found {len(filtered):,} symbols in price range ${min_price}-${max_price}")
     print(f"{'='*60}\n")
@@ -162,23 +122,20 @@ def fetch_historical_data_filtered(days: int = 7, timeframe: str = '1Min',
     print(f"\nFetching {timeframe} bars from {start_date.date()} to {end_date.date()} ({days} days)")
     print(f"Processing {len(filtered_symbols)} symbols...\n")
     
-    total_bars = 0
     successful = 0
     failed = 0
-    start_time = time.time()
     
     print(f"{'='*60}")
     print(f"STEP 2: Fetching historical data")
     print(f"{'='*60}\n")
     
-    for i, symbol in enumerate(filtered_symbols, 1):
+    progress = Progress(len(filtered_symbols))
+    # Inserts run on a background thread while the next symbol is fetched
+    writer = BarWriter().start()
+    
+    for symbol in filtered_symbols:
         try:
-            percent = (i / len(filtered_symbols)) * 100
-            elapsed = time.time() - start_time
-            rate = i / elapsed if elapsed > 0 else 0
-            remaining = (len(filtered_symbols) - i) / rate if rate > 0 else 0
-            
-            print(f"[{i}/{len(filtered_symbols)}] ({percent:.1f}%) Fetching {symbol}...", end=' ', flush=True)
+            progress.update()
             
             # Fetch bars
             symbol_start = time.time()
@@ -186,29 +143,28 @@ def fetch_historical_data_filtered(days: int = 7, timeframe: str = '1Min',
             fetch_time = time.time() - symbol_start
             
             if bars:
-                # Insert into database
-                inserted = insert_bars_batch(bars)
-                total_bars += inserted
+                # Hand off to the writer thread
+                writer.put(bars)
                 successful += 1
-                print(f"✓ {len(bars):,} bars ({inserted:,} new) in {fetch_time:.1f}s | "
-                      f"Total: {total_bars:,} bars | "
-                      f"ETA: {remaining/60:.1f}min")
+                progress.write(f"{progress.prefix()} Fetching {symbol}... "
+                               f"✓ {len(bars):,} bars in {fetch_time:.1f}s | "
+                               f"Stored so far: {writer.inserted:,} bars | "
+                               f"ETA: {progress.eta/60:.1f}min")
             else:
                 failed += 1
-                print(f"✗ No data | ETA: {remaining/60:.1f}min")
-            
-            # Rate limiting
-            time.sleep(0.2)
+                progress.write(f"{progress.prefix()} Fetching {symbol}... ✗ No data | ETA: {progress.eta/60:.1f}min")
             
         except KeyboardInterrupt:
-            print("\n\nInterrupted by user. Stopping...")
+            progress.write("\n\nInterrupted by user. Stopping...")
             break
         except Exception as e:
             failed += 1
-            print(f"✗ Error: {e} | ETA: {remaining/60:.1f}min")
+            progress.write(f"{progress.prefix()} Fetching {symbol}... ✗ Error: {e} | ETA: {progress.eta/60:.1f}min")
             continue
     
-    elapsed_total = time.time() - start_time
+    progress.close()
+    total_bars = writer.close()
+    elapsed_total = progress.elapsed
     print(f"\n{'='*60}")
     print(f"STEP 2 COMPLETE")
     print(f"{'='*60}")
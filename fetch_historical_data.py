@@ -1,37 +1,28 @@
 """
 Script to fetch and store 3 months of 1-minute historical bar data from Alpaca API.
 """
-import requests
-import yaml
+import json
+from pathlib import Path
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import Dict, Iterator, List
 import time
-from database import init_database, insert_bars_batch, get_latest_bar, get_data_range
+from database import init_database, get_latest_bar, get_data_range, cache_dir, BarRow
+from bar_writer import BarWriter
+from progress import Progress
+from alpaca_client import SESSION, BASE_URL, TRADING_URL, FEED, normalize_bars, retry_after_seconds
+from rate_limit import trading_limiter, data_limiter
 import sys
 
-# Load config
-with open('config.yml', 'r') as f:
-    config = yaml.safe_load(f)
+# How long the on-disk NYSE assets list (_assets_cache_path) is reused
+ASSETS_CACHE_TTL = 24 * 60 * 60  # seconds
 
-ALPACA_API_KEY = config['alpaca']['api_key']
-ALPACA_SECRET_KEY = config['alpaca']['api_secret']
-BASE_URL = config['alpaca']['data_url']
-TRADING_URL = config['alpaca']['trading_url']
-
-def get_headers():
-    return {
-        'APCA-API-KEY-ID': ALPACA_API_KEY,
-        'APCA-API-SECRET-KEY': ALPACA_SECRET_KEY
-    }
-
-def get_nyse_symbols() -> List[str]:
+def _fetch_nyse_symbols() -> List[str]:
     """Fetch NYSE symbols from Alpaca API"""
-    headers = get_headers()
     try:
         url = f'{TRADING_URL}/assets'
-        response = requests.get(
+        trading_limiter.acquire()
+        response = SESSION.get(
             url,
-            headers=headers,
             params={'status': 'active', 'exchange': 'NYSE', 'asset_class': 'us_equity'}
         )
         if response.status_code == 200:
@@ -46,9 +37,88 @@ def get_nyse_symbols() -> List[str]:
         print(f"Error fetching NYSE symbols: {e}")
         return []
 
-def fetch_bars(symbol: str, timeframe: str, start: datetime, end: datetime) -> List[Dict]:
+def _assets_cache_path() -> Path:
+    # Lives in database.cache_dir() next to the DB, not the current directory,
+    # so runs from old_scripts/ or cron share the same file
+    return Path(cache_dir()) / 'assets_nyse.json'
+
+def get_nyse_symbols() -> List[str]:
+    """
+    Return active NYSE symbols, served from a local cache file when it is
+    younger than ASSETS_CACHE_TTL so the full assets list isn't re-downloaded
+    on every run.
     """
-    Fetch historical bars from Alpaca API with pagination support
+    cache_path = _assets_cache_path()
+    try:
+        if time.time() - cache_path.stat().st_mtime < ASSETS_CACHE_TTL:
+            symbols = json.loads(cache_path.read_text())
+            print(f"Found {len(symbols)} active NYSE symbols (cached)")
+            return symbols
+    except (OSError, ValueError):
+        # Missing, unreadable or corrupt cache file: treat as a miss and rebuild it
+        pass
+    
+    symbols = _fetch_nyse_symbols()
+    if symbols:
+        # Write then rename, so an interrupted run can't leave a truncated cache behind
+        tmp_path = cache_path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(symbols))
+        tmp_path.replace(cache_path)
+    return symbols
+
+# 429s that get past the session's own retries are waited out this many times
+# per page before giving up; RATE_LIMIT_WAIT is used when Retry-After is unusable
+MAX_RATE_LIMIT_RETRIES = 5
+RATE_LIMIT_WAIT = 1.0  # seconds
+
+def _get_pages(url: str, params: Dict) -> Iterator[Dict]:
+    """
+    GET a paginated bars endpoint and yield each page's JSON body, following
+    next_page_token until exhausted. Every request draws from the shared
+    data_limiter bucket.
+
+    429s that got past the session's retries are waited out (Retry-After) up
+    to MAX_RATE_LIMIT_RETRIES times per page. Any other error status or
+    request exception is printed and ends the iteration, so callers keep the
+    pages they already received.
+    """
+    params = dict(params)
+    rate_limited = 0
+    while True:
+        try:
+            data_limiter.acquire()
+            response = SESSION.get(url, params=params)
+            
+            if response.status_code == 429:
+                # Adapter retries were exhausted; wait as long as the API asks,
+                # but give up on this request after MAX_RATE_LIMIT_RETRIES waits
+                rate_limited += 1
+                if rate_limited > MAX_RATE_LIMIT_RETRIES:
+                    print(f"    Still rate limited after {MAX_RATE_LIMIT_RETRIES} retries, giving up")
+                    return
+                retry_after = retry_after_seconds(response, RATE_LIMIT_WAIT)
+                print(f"    Rate limited, waiting {retry_after:.0f}s...")
+                time.sleep(retry_after)
+                continue  # Retry this page
+            if response.status_code != 200:
+                print(f"    Error: {response.status_code} - {response.text[:200]}")
+                return  # Stop on error
+            data = response.json()
+        except Exception as e:
+            print(f"    Exception: {e}")
+            return
+        
+        yield data
+        
+        next_page_token = data.get('next_page_token')
+        if not next_page_token:
+            return
+        params['page_token'] = next_page_token
+        rate_limited = 0
+
+def fetch_bars(symbol: str, timeframe: str, start: datetime, end: datetime) -> List[BarRow]:
+    """
+    Fetch historical bars from Alpaca API with pagination support.
     
     Args:
         symbol: Stock symbol
@@ -57,86 +127,62 @@ def fetch_bars(symbol: str, timeframe: str, start: datetime, end: datetime) -> L
         end: End datetime
     
     Returns:
-        List of bar dictionaries
+        List of positional bar rows (see database.BAR_COLUMNS)
     """
-    headers = get_headers()
     all_bars = []
+    url = f'{BASE_URL}/stocks/{symbol}/bars'
+    params = {
+        'timeframe': timeframe,
+        'start': start.strftime('%Y-%m-%dT%H:%M:%S-05:00'),
+        'end': end.strftime('%Y-%m-%dT%H:%M:%S-05:00'),
+        'adjustment': 'raw',
+        'feed': FEED,
+        'limit': 10000  # Max limit
+    }
     
-    # Alpaca API limits to 1000 bars per request, so we need to paginate
-    # Split into chunks of ~7 days to stay under limit
-    current_start = start
-    chunk_days = 7  # Fetch 7 days at a time (about 2730 minutes, well under 1000 limit for 1Min)
+    # Request the whole range and follow next_page_token until exhausted
+    for page, data in enumerate(_get_pages(url, params)):
+        if data.get('bars'):
+            all_bars.extend(normalize_bars(symbol, timeframe, data['bars']))
+            # Don't print progress here - let the caller handle it
+        elif page == 0:
+            print(f"    No bars in response for {start.date()} to {end.date()}")
     
-    while current_start < end:
-        # Calculate chunk end (7 days or until end date)
-        chunk_end = min(current_start + timedelta(days=chunk_days), end)
-        
-        start_str = current_start.strftime('%Y-%m-%dT%H:%M:%S-05:00')
-        end_str = chunk_end.strftime('%Y-%m-%dT%H:%M:%S-05:00')
-        
-        url = f'{BASE_URL}/stocks/{symbol}/bars'
-        
-        try:
-            response = requests.get(
-                url,
-                headers=headers,
-                params={
-                    'timeframe': timeframe,
-                    'start': start_str,
-                    'end': end_str,
-                    'adjustment': 'raw',
-                    'feed': 'iex',
-                    'limit': 10000  # Max limit
-                }
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if 'bars' in data and data['bars']:
-                    chunk_bars = []
-                    for bar in data['bars']:
-                        # Convert ISO timestamp to Unix timestamp
-                        ts = datetime.fromisoformat(bar['t'].replace('Z', '+00:00'))
-                        timestamp = int(ts.timestamp())
-                        
-                        chunk_bars.append({
-                            'symbol': symbol,
-                            'timeframe': timeframe,
-                            'timestamp': timestamp,
-                            'open': float(bar['o']),
-                            'high': float(bar['h']),
-                            'low': float(bar['l']),
-                            'close': float(bar['c']),
-                            'volume': int(bar['v'])
-                        })
-                    
-                    all_bars.extend(chunk_bars)
-                    # Don't print progress here - let the caller handle it
-                    
-                    # Check for pagination token
-                    if 'next_page_token' in data and data['next_page_token']:
-                        # If there's a next page, continue with that token
-                        # For now, we'll just move to next chunk
-                        pass
-                    
-                    # Rate limiting
-                    time.sleep(0.1)
-                else:
-                    print(f"    No bars in response for {current_start.date()} to {chunk_end.date()}")
-            elif response.status_code == 429:
-                print(f"    Rate limited, waiting...")
-                time.sleep(2)
-                continue  # Retry this chunk
-            else:
-                print(f"    Error: {response.status_code} - {response.text[:200]}")
-                break  # Stop on error
-                
-        except Exception as e:
-            print(f"    Exception: {e}")
-            break
-        
-        # Move to next chunk
-        current_start = chunk_end + timedelta(seconds=1)  # Add 1 second to avoid overlap
+    return all_bars
+
+# Alpaca's documented cap on symbols per multi-symbol bars request
+MAX_SYMBOLS_PER_REQUEST = 200
+
+def fetch_bars_multi(symbols: List[str], timeframe: str, start: datetime, end: datetime) -> List[BarRow]:
+    """
+    Fetch historical bars for several symbols in one request stream via the
+    multi-symbol endpoint, with pagination support
+    
+    Args:
+        symbols: Stock symbols (at most MAX_SYMBOLS_PER_REQUEST)
+        timeframe: '1Min', '1Sec', etc.
+        start: Start datetime
+        end: End datetime
+    
+    Returns:
+        List of positional bar rows (see database.BAR_COLUMNS) for all symbols
+    """
+    all_bars = []
+    url = f'{BASE_URL}/stocks/bars'
+    params = {
+        'symbols': ','.join(symbols),
+        'timeframe': timeframe,
+        'start': start.strftime('%Y-%m-%dT%H:%M:%S-05:00'),
+        'end': end.strftime('%Y-%m-%dT%H:%M:%S-05:00'),
+        'adjustment': 'raw',
+        'feed': FEED,
+        'limit': 10000  # Max limit (counted across all symbols in a page)
+    }
+    
+    for data in _get_pages(url, params):
+        # Response bars are keyed by symbol: {"AAPL": [...], "MSFT": [...]}
+        for symbol, bars in (data.get('bars') or {}).items():
+            all_bars.extend(normalize_bars(symbol, timeframe, bars or []))
     
     return all_bars
 
@@ -156,12 +202,15 @@ def fetch_historical_data(symbols: List[str], months: int = 3, timeframe: str =
     print(f"\nFetching {timeframe} bars from {start_date.date()} to {end_date.date()}")
     print(f"Processing {len(symbols)} symbols...\n")
     
-    total_bars = 0
     successful = 0
     failed = 0
+    progress = Progress(len(symbols), desc=timeframe)
+    # Inserts run on a background thread while the next symbol is fetched
+    writer = BarWriter().start()
     
-    for i, symbol in enumerate(symbols, 1):
+    for symbol in symbols:
         try:
+            progress.update()
             # Check if we already have recent data
             latest = get_latest_bar(symbol, timeframe)
             if latest:
@@ -169,35 +218,32 @@ def fetch_historical_data(symbols: List[str], months: int = 3, timeframe: str =
                 latest_dt = datetime.fromtimestamp(latest_ts)
                 # If we have data within last 7 days, skip
                 if (datetime.now() - latest_dt).days < 7:
-                    print(f"[{i}/{len(symbols)}] {symbol}: Already has recent data, skipping")
+                    progress.write(f"{progress.prefix()} {symbol}: Already has recent data, skipping")
                     continue
             
-            print(f"[{i}/{len(symbols)}] Fetching {symbol}...", end=' ', flush=True)
-            
             # Fetch bars
             bars = fetch_bars(symbol, timeframe, start_date, end_date)
             
             if bars:
-                # Insert into database
-                inserted = insert_bars_batch(bars)
-                total_bars += inserted
+                # Hand off to the writer thread
+                writer.put(bars)
                 successful += 1
-                print(f"✓ {len(bars)} bars ({inserted} new)")
+                progress.write(f"{progress.prefix()} Fetching {symbol}... ✓ {len(bars)} bars")
             else:
                 failed += 1
-                print("✗ No data")
-            
-            # Rate limiting - be nice to the API
-            time.sleep(0.2)
+                progress.write(f"{progress.prefix()} Fetching {symbol}... ✗ No data")
             
         except KeyboardInterrupt:
-            print("\n\nInterrupted by user. Stopping...")
+            progress.write("\n\nInterrupted by user. Stopping...")
             break
         except Exception as e:
             failed += 1
-            print(f"✗ Error: {e}")
+            progress.write(f"{progress.prefix()} Fetching {symbol}... ✗ Error: {e}")
             continue
     
+    progress.close()
+    total_bars = writer.close()
+    
     print(f"\n{'='*60}")
     print(f"Summary:")
     print(f"  Symbols processed: {len(symbols)}")
@@ -2,7 +2,8 @@
 On-demand catch-up ingest for 1m, 5m, and 30m bars.
 
 Goals:
-- Efficient API usage: call Alpaca multi-symbol bars endpoint in chunks (not per symbol).
+- Efficient API usage: call Alpaca multi-symbol bars endpoint in chunks (not per symbol),
+  with several chunks in flight at once.
 - Compute a conservative catch-up window per timeframe based on latest stored bars,
   with a small overlap buffer to cover late data and avoid gaps.
 - Insert rows in batch; rely on UNIQUE(symbol,timeframe,timestamp) to drop duplicates.
@@ -11,39 +12,35 @@ Usage examples:
   python -u ingest_catchup.py               # run all timeframes (1m,5m,30m)
   python -u ingest_catchup.py --tfs 1m,5m   # run a subset
   python -u ingest_catchup.py --chunk 120   # change symbol chunk size
+  python -u ingest_catchup.py --concurrency 4   # fewer requests in flight
 
 Notes:
 - Time is handled in UTC. Alpaca v2 supports ISO8601 with 'Z' suffix.
 """
 import argparse
+import random
+import threading
 import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 import requests
-import yaml
 
 from database import (
 	get_connection,
 	init_database,
-	insert_bars_batch,
 	get_symbols_with_data,
 	create_ingest_run,
 	update_ingest_run,
+	BarRow,
 )
+from alpaca_client import SESSION, BASE_URL, FEED, normalize_bars, normalize_tagged_bars, retry_after_seconds
+from bar_writer import BarWriter
+from rate_limit import data_limiter
 import os
 
 
-# --- Config / Headers ---
-with open('config.yml', 'r') as f:
-	_cfg = yaml.safe_load(f)
-
-BASE_URL = _cfg['alpaca']['data_url']
-HEADERS = {
-	'APCA-API-KEY-ID': _cfg['alpaca']['api_key'],
-	'APCA-API-SECRET-KEY': _cfg['alpaca']['api_secret']
-}
-
-
 # --- Helpers ---
 def utcnow() -> datetime:
 	return datetime.now(timezone.utc)
@@ -58,106 +55,120 @@ def parse_tf(tf: str) -> str:
 		return '30Min'
 	raise ValueError(f"Unsupported timeframe: {tf}")
 
+
+# RFC 3339 UTC layout Alpaca accepts for start/end (datetimes here are always UTC)
+ALPACA_TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
 def chunked(lst: List[str], size: int):
 	for i in range(0, len(lst), size):
 		yield lst[i:i+size]
 
 
-def fetch_bars_multi(symbols: List[str], timeframe: str, start: datetime, end: datetime) -> List[Dict]:
+def fetch_bars_multi(symbols: List[str], timeframe: str, start: datetime, end: datetime) -> Tuple[List[BarRow], Optional[int], Optional[int]]:
 	"""
 	Fetch bars for multiple symbols via Alpaca v2 multi-symbol endpoint.
-	Normalizes the payload into rows ready for DB insert.
+	Normalizes the payload into positional rows ready for DB insert.
+
+	Pages through next_page_token so no bars beyond the per-request limit are dropped.
+
+	Returns (rows, remaining, reset): the rows plus Alpaca's X-Ratelimit-Remaining
+	request count and X-Ratelimit-Reset epoch seconds (None when a header is absent).
+	On 429 the raised HTTPError carries the response so Retry-After can be read.
 	"""
 	if not symbols:
-		return []
+		return [], None, None
 
 	params = {
 		'timeframe': timeframe,
 		'symbols': ','.join(symbols),
-		'start': start.isoformat().replace('+00:00', 'Z'),
-		'end': end.isoformat().replace('+00:00', 'Z'),
+		'start': start.strftime(ALPACA_TIME_FORMAT),
+		'end': end.strftime(ALPACA_TIME_FORMAT),
 		'adjustment': 'raw',
-		'feed': 'iex',
+		'feed': FEED,
 		'limit': 10000
 	}
 
-	resp = requests.get(f'{BASE_URL}/stocks/bars', headers=HEADERS, params=params, timeout=30)
-	if resp.status_code == 429:
-		# signal caller to retry later
-		raise requests.HTTPError("429 Too Many Requests")
-	resp.raise_for_status()
-	data = resp.json()
-
-	rows: List[Dict] = []
-
-	# Shape A: {"bars":[{"S":"SYM","t":"...","o":...}, ...]}
-	if isinstance(data.get('bars'), list):
-		for bar in data['bars']:
-			sym = bar.get('S') or bar.get('Symbol')
-			if not sym:
-				continue
-			ts = datetime.fromisoformat(bar['t'].replace('Z', '+00:00')).timestamp()
-			rows.append({
-				'symbol': sym,
-				'timeframe': timeframe,
-				'timestamp': int(ts),
-				'open': float(bar['o']),
-				'high': float(bar['h']),
-				'low': float(bar['l']),
-				'close': float(bar['c']),
-				'volume': int(bar['v']),
-			})
-		return rows
-
-	# Shape B: {"bars":{"SYM":[{...}, ...], "SYM2":[...]}}
-	if isinstance(data.get('bars'), dict):
-		for sym, bars in data['bars'].items():
-			for bar in bars or []:
-				ts = datetime.fromisoformat(bar['t'].replace('Z', '+00:00')).timestamp()
-				rows.append({
-					'symbol': sym,
-					'timeframe': timeframe,
-					'timestamp': int(ts),
-					'open': float(bar['o']),
-					'high': float(bar['h']),
-					'low': float(bar['l']),
-					'close': float(bar['c']),
-					'volume': int(bar['v']),
-				})
-		return rows
-
-	return rows
-
-
-def get_latest_by_symbol(timeframe: str, symbols: List[str]) -> Dict[str, int]:
+	rows: List[BarRow] = []
+
+	# Follow next_page_token until the window is exhausted; with a 10k page limit
+	# a large chunk would otherwise silently lose everything past the first page
+	while True:
+		# Shared process-wide budget, on top of the header-driven pacing below
+		data_limiter.acquire()
+		# Pooled keep-alive session: no new TCP+TLS handshake per chunk
+		resp = SESSION.get(f'{BASE_URL}/stocks/bars', params=params, timeout=30)
+		if resp.status_code == 429:
+			# signal caller to retry later
+			raise requests.HTTPError("429 Too Many Requests", response=resp)
+		resp.raise_for_status()
+		remaining = resp.headers.get('X-Ratelimit-Remaining')
+		reset = resp.headers.get('X-Ratelimit-Reset')
+		remaining = int(remaining) if remaining is not None else None
+		reset = int(reset) if reset is not None else None
+		data = resp.json()
+
+		# Shape A: {"bars":[{"S":"SYM","t":"...","o":...}, ...]}
+		if isinstance(data.get('bars'), list):
+			rows.extend(normalize_tagged_bars(timeframe, data['bars']))
+
+		# Shape B: {"bars":{"SYM":[{...}, ...], "SYM2":[...]}}
+		elif isinstance(data.get('bars'), dict):
+			for sym, bars in data['bars'].items():
+				rows.extend(normalize_bars(sym, timeframe, bars or []))
+
+		next_token = data.get('next_page_token')
+		if not next_token:
+			break
+		params['page_token'] = next_token
+
+	return rows, remaining, reset
+
+
+def get_latest_by_timeframe(timeframes: List[str], symbols: List[str]) -> Dict[str, Dict[str, int]]:
 	"""
-	Return dict mapping symbol -> latest timestamp (unix seconds) for given timeframe.
-	Missing symbols won't be present in the map.
+	Return timeframe -> {symbol -> latest timestamp (unix seconds)} for all the
+	given timeframes in one grouped query. Missing symbols won't be present.
 	"""
 	conn = get_connection()
 	cur = conn.cursor()
+	placeholders = ','.join('?' * len(timeframes))
 	cur.execute(
-		"""
-		SELECT symbol, MAX(timestamp) AS max_ts
+		f"""
+		SELECT timeframe, symbol, MAX(timestamp) AS max_ts
 		FROM bars
-		WHERE timeframe = ?
-		GROUP BY symbol
+		WHERE timeframe IN ({placeholders})
+		GROUP BY timeframe, symbol
 		""",
-		(timeframe,),
+		list(timeframes),
 	)
 	rows = cur.fetchall()
 	conn.close()
-	result: Dict[str, int] = {row[0]: int(row[1]) for row in rows if row[1] is not None}
 
-	# Restrict to requested symbols for cleanliness
-	return {s: result[s] for s in symbols if s in result}
+	# Restrict to requested symbols for cleanliness (one pass over the result)
+	wanted = set(symbols)
+	result: Dict[str, Dict[str, int]] = {tf: {} for tf in timeframes}
+	for tf, sym, max_ts in rows:
+		if max_ts is not None and sym in wanted:
+			result[tf][sym] = int(max_ts)
+	return result
 
 
-def compute_catchup_window(timeframe: str, symbols: List[str]) -> Tuple[datetime, datetime]:
+def get_latest_by_symbol(timeframe: str, symbols: List[str]) -> Dict[str, int]:
+	"""
+	Return dict mapping symbol -> latest timestamp (unix seconds) for given timeframe.
+	Missing symbols won't be present in the map.
+	"""
+	return get_latest_by_timeframe([timeframe], symbols)[timeframe]
+
+
+def compute_catchup_window(timeframe: str, symbols: List[str],
+                           latest_map: Optional[Dict[str, int]] = None) -> Tuple[datetime, datetime]:
 	"""
 	Compute a conservative [start,end] for catch-up for this timeframe across all symbols.
 	- If some symbols have no data, fall back to default horizon.
 	- Apply a small overlap buffer to cover late-arriving bars.
+	- Pass `latest_map` (from get_latest_by_symbol) to reuse an already-fetched result.
 	"""
 	now = utcnow()
 
@@ -174,7 +185,8 @@ def compute_catchup_window(timeframe: str, symbols: List[str]) -> Tuple[datetime
 		'30Min': timedelta(days=56),
 	}
 
-	latest_map = get_latest_by_symbol(timeframe, symbols)
+	if latest_map is None:
+		latest_map = get_latest_by_symbol(timeframe, symbols)
 
 	if len(latest_map) < len(symbols):
 		# Some symbols have no data for this TF; start from a reasonable fallback
@@ -189,14 +201,56 @@ def compute_catchup_window(timeframe: str, symbols: List[str]) -> Tuple[datetime
 	return start, now
 
 
-def run_catchup_for_timeframe(symbols: List[str], timeframe: str, chunk_size: int, pause_s: float) -> int:
+# Below this many remaining requests in the current window, hold off until it resets
+RATE_LIMIT_FLOOR = 5
+
+# Attempts per symbol chunk before a rate-limited chunk is dropped
+MAX_CHUNK_ATTEMPTS = 5
+
+# Earliest time any catch-up worker may send its next request (epoch seconds)
+_resume_at = 0.0
+_resume_lock = threading.Lock()
+
+
+def _defer_requests_until(ts: float):
+	global _resume_at
+	with _resume_lock:
+		_resume_at = max(_resume_at, ts)
+
+
+def _fetch_group(group: List[str], timeframe: str, start: datetime, end: datetime, pause_s: float) -> List[BarRow]:
+	"""
+	Worker: fetch one symbol chunk. Pacing follows Alpaca's rate-limit headers:
+	when the window is nearly spent (or on 429) every worker waits for the reset /
+	Retry-After time; otherwise only the fixed pause applies.
+	"""
+	delay = _resume_at - time.time()
+	if delay > 0:
+		time.sleep(delay)
+	try:
+		rows, remaining, reset = fetch_bars_multi(group, timeframe, start, end)
+	except requests.HTTPError as e:
+		if e.response is not None and e.response.status_code == 429:
+			_defer_requests_until(time.time() + retry_after_seconds(e.response))
+		raise
+	if remaining is not None and reset is not None and remaining < RATE_LIMIT_FLOOR:
+		_defer_requests_until(reset)
+	else:
+		time.sleep(pause_s)
+	return rows
+
+
+def run_catchup_for_timeframe(symbols: List[str], timeframe: str, chunk_size: int, pause_s: float,
+                              concurrency: int = 8, latest_map: Optional[Dict[str, int]] = None) -> int:
 	"""
 	Run catch-up cycle for one timeframe across all symbols.
+	Symbol chunks are fetched concurrently (at most `concurrency` requests in flight),
+	so total latency tracks the slowest requests rather than the sum of all of them.
+	Fetched rows are written by a BarWriter thread, so inserts overlap the network I/O.
 	Returns number of rows newly inserted.
 	"""
-	start, end = compute_catchup_window(timeframe, symbols)
+	start, end = compute_catchup_window(timeframe, symbols, latest_map)
 	print(f"[{timeframe}] Catch-up window: {start.isoformat()} -> {end.isoformat()}")
-	total_inserted = 0
 
 	# create run record
 	run_id = create_ingest_run(
@@ -207,25 +261,39 @@ def run_catchup_for_timeframe(symbols: List[str], timeframe: str, chunk_size: in
 		pid=os.getpid()
 	)
 
-	for group in chunked(symbols, chunk_size):
-		try:
-			rows = fetch_bars_multi(group, timeframe, start, end)
-			if rows:
-				inserted = insert_bars_batch(rows) or 0
-				total_inserted += inserted
-				if inserted:
-					update_ingest_run(run_id, inserted_rows_increment=inserted)
-			time.sleep(pause_s)
-		except requests.HTTPError as e:
-			if '429' in str(e):
-				print(f"[{timeframe}] Rate limited; backing off...")
-				time.sleep(2.0)
-				continue
-			else:
-				print(f"[{timeframe}] HTTP error: {e}")
-		except Exception as e:
-			print(f"[{timeframe}] Error: {e}")
-
+	# Rate-limited chunks go back on the queue with exponential backoff + jitter
+	pending = deque(chunked(symbols, chunk_size))
+	attempts: Dict[str, int] = {}
+	writer = BarWriter(on_insert=lambda n: update_ingest_run(run_id, inserted_rows_increment=n))
+	with writer, ThreadPoolExecutor(max_workers=concurrency) as executor:
+		in_flight = {}
+		while pending or in_flight:
+			while pending:
+				group = pending.popleft()
+				in_flight[executor.submit(_fetch_group, group, timeframe, start, end, pause_s)] = group
+			done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+			for future in done:
+				group = in_flight.pop(future)
+				try:
+					# Hand rows to the writer thread and go straight back to fetching
+					writer.put(future.result())
+				except requests.HTTPError as e:
+					if e.response is not None and e.response.status_code == 429:
+						attempt = attempts.get(group[0], 0) + 1
+						attempts[group[0]] = attempt
+						if attempt >= MAX_CHUNK_ATTEMPTS:
+							print(f"[{timeframe}] Rate limited {attempt} times; giving up on chunk starting {group[0]}")
+							continue
+						backoff = min(60, 2 ** attempt + random.random())
+						print(f"[{timeframe}] Rate limited; retrying chunk in {backoff:.1f}s (attempt {attempt})")
+						_defer_requests_until(time.time() + backoff)
+						pending.append(group)
+					else:
+						print(f"[{timeframe}] HTTP error: {e}")
+				except Exception as e:
+					print(f"[{timeframe}] Error: {e}")
+
+	total_inserted = writer.inserted
 	print(f"[{timeframe}] Inserted {total_inserted:,} rows")
 	# finish run
 	update_ingest_run(run_id, status='finished', ended_at_now=True)
@@ -236,8 +304,9 @@ def main():
 	parser = argparse.ArgumentParser(description="On-demand catch-up ingest for multiple timeframes.")
 	parser.add_argument('--tfs', type=str, default='1m,5m,30m',
 	                    help="Comma-separated list of timeframes: 1m,5m,30m (default: all)")
-	parser.add_argument('--chunk', type=int, default=100, help="Symbols per request (default: 100)")
-	parser.add_argument('--pause', type=float, default=0.15, help="Pause seconds between chunked requests (default: 0.15)")
+	parser.add_argument('--chunk', type=int, default=200, help="Symbols per request (default: 200)")
+	parser.add_argument('--pause', type=float, default=0.15, help="Pause seconds between chunked requests per worker (default: 0.15)")
+	parser.add_argument('--concurrency', type=int, default=8, help="Max concurrent chunk requests (default: 8)")
 	args = parser.parse_args()
 
 	timeframes = [parse_tf(tf) for tf in args.tfs.split(',') if tf.strip()]
@@ -250,9 +319,12 @@ def main():
 		return
 
 	print(f"Running catch-up for {len(symbols)} symbols; timeframes: {', '.join(timeframes)}")
+	# Latest bar per (timeframe, symbol) for every timeframe in one query
+	latest_maps = get_latest_by_timeframe(timeframes, symbols)
 	total = 0
 	for tf in timeframes:
-		total += run_catchup_for_timeframe(symbols, tf, args.chunk, args.pause)
+		total += run_catchup_for_timeframe(symbols, tf, args.chunk, args.pause, args.concurrency,
+		                                   latest_map=latest_maps[tf])
 
 	print(f"Done. Total newly inserted rows across all timeframes: {total:,}")
 
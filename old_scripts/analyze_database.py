@@ -1,7 +1,7 @@
 """
 Analyze the database to see what data we currently have
 """
-from database import get_connection, get_symbols_with_data, get_latest_bar, get_data_range, get_bar_count
+from database import get_connection, get_latest_closes
 from datetime import datetime, timedelta
 
 def analyze_database():
@@ -91,48 +91,42 @@ def analyze_database():
     old_bars = cursor.fetchone()[0]
     print(f"\n1Min bars older than cutoff: {old_bars:,}")
     
-    # Get symbols with 1Min data and their latest prices
-    symbols = get_symbols_with_data('1Min')
-    print(f"\nSymbols with 1Min data: {len(symbols)}")
+    # Latest close for every 1Min symbol in one window query
+    latest_closes = get_latest_closes('1Min')
+    print(f"\nSymbols with 1Min data: {len(latest_closes)}")
     
     print(f"\nSample symbols (first 20) with latest prices:")
-    price_ranges = {'under_1': [], '1_to_20': [], 'over_20': []}
-    
-    for symbol in symbols[:20]:
-        latest = get_latest_bar(symbol, '1Min')
-        if latest:
-            price = latest['close']
-            date_range = get_data_range(symbol, '1Min')
-            count = get_bar_count(symbol=symbol, timeframe='1Min')
-            
-            if price < 1.0:
-                price_ranges['under_1'].append((symbol, price))
-                status = "UNDER $1"
-            elif price <= 20.0:
-                price_ranges['1_to_20'].append((symbol, price))
-                status = "OK"
-            else:
-                price_ranges['over_20'].append((symbol, price))
-                status = "OVER $20"
-            
-            if date_range:
-                min_dt = datetime.fromtimestamp(date_range[0])
-                max_dt = datetime.fromtimestamp(date_range[1])
-                days = (max_dt - min_dt).days
-                print(f"  {symbol}: ${price:.2f} ({status}) - {count:,} bars - {min_dt.date()} to {max_dt.date()} ({days} days)")
+    cursor.execute('''
+        SELECT symbol, MIN(timestamp), MAX(timestamp), COUNT(*)
+        FROM bars
+        WHERE timeframe = '1Min'
+        GROUP BY symbol
+        ORDER BY symbol
+        LIMIT 20
+    ''')
+    for symbol, min_ts, max_ts, count in cursor.fetchall():
+        price = latest_closes.get(symbol)
+        if price is None:
+            continue
+        if price < 1.0:
+            status = "UNDER $1"
+        elif price <= 20.0:
+            status = "OK"
+        else:
+            status = "OVER $20"
+        
+        min_dt = datetime.fromtimestamp(min_ts)
+        max_dt = datetime.fromtimestamp(max_ts)
+        days = (max_dt - min_dt).days
+        print(f"  {symbol}: ${price:.2f} ({status}) - {count:,} bars - {min_dt.date()} to {max_dt.date()} ({days} days)")
     
     # Count all symbols by price range
     print(f"\nAnalyzing ALL symbols for price ranges...")
-    for symbol in symbols:
-        latest = get_latest_bar(symbol, '1Min')
-        if latest:
-            price = latest['close']
-            if price < 1.0:
-                price_ranges['under_1'].append((symbol, price))
-            elif price <= 20.0:
-                price_ranges['1_to_20'].append((symbol, price))
-            else:
-                price_ranges['over_20'].append((symbol, price))
+    price_ranges = {
+        'under_1': [(s, p) for s, p in latest_closes.items() if p < 1.0],
+        '1_to_20': [(s, p) for s, p in latest_closes.items() if 1.0 <= p <= 20.0],
+        'over_20': [(s, p) for s, p in latest_closes.items() if p > 20.0],
+    }
     
     print(f"\nPrice range summary:")
     print(f"  Under $1: {len(price_ranges['under_1'])} symbols")
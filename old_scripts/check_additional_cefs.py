@@ -2,6 +2,7 @@
 Check which additional CEFs and Bond Funds are in the database
 """
 from database import get_symbols_with_data
+import sys
 
 # Additional list of CEFs and Bond Funds to remove
 CEF_SYMBOLS = [
@@ -21,23 +22,22 @@ CEF_SYMBOLS = [
     'WHG', 'WLKP', 'WSR', 'XZO', 'YCY'
 ]
 
-# Normalize to uppercase
-CEF_SYMBOLS_SET = {s.upper() for s in CEF_SYMBOLS}
+# Normalize to an uppercase frozenset of interned strings for fast lookup
+CEF_SYMBOLS_SET = frozenset(sys.intern(s.upper()) for s in CEF_SYMBOLS)
 
 # Get symbols in database
-db_symbols = get_symbols_with_data('1Min')
-db_symbols_set = set(s.upper() for s in db_symbols)
+db_symbols_set = get_symbols_with_data('1Min', as_set=True)
 
-# Find matches
-matches = [s for s in CEF_SYMBOLS_SET if s in db_symbols_set]
+# Find matches (C-level set intersection, sorted for stable output)
+matches = sorted(CEF_SYMBOLS_SET & db_symbols_set)
 
 print("=" * 80)
 print("CHECKING FOR ADDITIONAL CEFs AND BOND FUNDS")
 print("=" * 80)
 print(f"\nTotal CEF/Bond Fund symbols in list: {len(CEF_SYMBOLS)}")
-print(f"Total symbols in database: {len(db_symbols)}")
+print(f"Total symbols in database: {len(db_symbols_set)}")
 print(f"\nCEF/Bond Fund symbols found in database: {len(matches)}")
-print(f"Percentage of database: {(len(matches)/len(db_symbols)*100):.1f}%")
+print(f"Percentage of database: {(len(matches)/len(db_symbols_set)*100):.1f}%")
 
 if matches:
     print(f"\nFound in database:")
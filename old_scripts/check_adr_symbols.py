@@ -2,6 +2,7 @@
 Check how many ADR (American Depositary Receipt) symbols are in the database
 """
 from database import get_symbols_with_data
+import sys
 
 # List of ADRs to remove
 ADR_SYMBOLS = [
@@ -18,23 +19,22 @@ ADR_SYMBOLS = [
     'YSG', 'ZH'
 ]
 
-# Normalize to uppercase
-ADR_SYMBOLS_SET = {s.upper() for s in ADR_SYMBOLS}
+# Normalize to an uppercase frozenset of interned strings for fast lookup
+ADR_SYMBOLS_SET = frozenset(sys.intern(s.upper()) for s in ADR_SYMBOLS)
 
 # Get symbols in database
-db_symbols = get_symbols_with_data('1Min')
-db_symbols_set = set(s.upper() for s in db_symbols)
+db_symbols_set = get_symbols_with_data('1Min', as_set=True)
 
 # Find matches
-matches = [s for s in ADR_SYMBOLS_SET if s in db_symbols_set]
+matches = sorted(ADR_SYMBOLS_SET & db_symbols_set)
 
 print("=" * 80)
 print("CHECKING FOR ADRs (AMERICAN DEPOSITARY RECEIPTS)")
 print("=" * 80)
 print(f"\nTotal ADR symbols in list: {len(ADR_SYMBOLS)}")
-print(f"Total symbols in database: {len(db_symbols)}")
+print(f"Total symbols in database: {len(db_symbols_set)}")
 print(f"\nADR symbols found in database: {len(matches)}")
-print(f"Percentage of database: {(len(matches)/len(db_symbols)*100):.1f}%")
+print(f"Percentage of database: {(len(matches)/len(db_symbols_set)*100):.1f}%")
 
 if matches:
     print(f"\nFound in database:")
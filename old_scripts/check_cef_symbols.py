@@ -35,19 +35,18 @@ cef_symbols = [
 cef_symbols = [s.upper() for s in cef_symbols]
 
 # Get symbols in database
-db_symbols = get_symbols_with_data('1Min')
-db_symbols_set = set(s.upper() for s in db_symbols)
+db_symbols_set = get_symbols_with_data('1Min', as_set=True)
 
 # Find matches
-matches = [s for s in cef_symbols if s in db_symbols_set]
+matches = sorted(db_symbols_set.intersection(cef_symbols))
 
 print("=" * 80)
 print("CHECKING FOR CLOSED-END FUNDS (CEFs) AND BOND FUNDS")
 print("=" * 80)
 print(f"\nTotal CEF/Bond Fund symbols in list: {len(cef_symbols)}")
-print(f"Total symbols in database: {len(db_symbols)}")
+print(f"Total symbols in database: {len(db_symbols_set)}")
 print(f"\nCEF/Bond Fund symbols found in database: {len(matches)}")
-print(f"Percentage of database: {(len(matches)/len(db_symbols)*100):.1f}%")
+print(f"Percentage of database: {(len(matches)/len(db_symbols_set)*100):.1f}%")
 
 if matches:
     print(f"\nFound in database:")
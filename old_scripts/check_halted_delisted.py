@@ -2,86 +2,58 @@
 Check remaining symbols for halted, delisted, or inactive status.
 Remove symbols that are no longer tradeable.
 """
-from alpaca.trading.client import TradingClient
 from database import get_connection, get_symbols_with_data
-import yaml
-import time
+from alpaca_client import fetch_all_assets
+from typing import Dict, Set
 
-# Load config
-with open('config.yml', 'r') as f:
-    config = yaml.safe_load(f)
-
-ALPACA_API_KEY = config['alpaca']['api_key']
-ALPACA_SECRET_KEY = config['alpaca']['api_secret']
+def classify_assets(assets: Dict[str, Dict]) -> Dict[str, Set[str]]:
+    """
+    Split the bulk asset list into issue categories. Each symbol lands in at
+    most one: inactive first, then not tradable, then any other non-active status.
+    
+    Returns:
+        Dict of issue_category -> set of symbols ('inactive', 'not_tradable', 'suspended')
+    """
+    inactive = {symbol for symbol, asset in assets.items()
+                if (asset.get('status') or '').lower() == 'inactive'}
+    not_tradable = {symbol for symbol, asset in assets.items()
+                    if not asset.get('tradable', True)} - inactive
+    suspended = {symbol for symbol, asset in assets.items()
+                 if (asset.get('status') or 'unknown').lower() != 'active'} - inactive - not_tradable
+    return {'inactive': inactive, 'not_tradable': not_tradable, 'suspended': suspended}
 
 def check_halted_delisted():
     """Check all symbols for halted/delisted status"""
-    trading_client = TradingClient(ALPACA_API_KEY, ALPACA_SECRET_KEY)
     conn = get_connection()
     
     print("=" * 80)
     print("CHECKING FOR HALTED/DELISTED SYMBOLS")
     print("=" * 80)
     
-    symbols = get_symbols_with_data('1Min')
+    symbols = get_symbols_with_data('1Min', as_set=True)
     print(f"\nFound {len(symbols)} symbols to check\n")
     
+    # One request for the whole asset list, then classify with set operations
+    # instead of walking the database symbols one by one
+    assets = fetch_all_assets()
+    print(f"Fetched {len(assets):,} US equity assets from Alpaca\n")
+    
+    categories = classify_assets(assets)
+    not_found = symbols - assets.keys()
+    inactive = symbols & categories['inactive']
+    not_tradable = symbols & categories['not_tradable']
+    suspended = symbols & categories['suspended']
+    valid_symbols = sorted(symbols - not_found - inactive - not_tradable - suspended)
+    
     issues = {
-        'not_found': [],
-        'inactive': [],
-        'not_tradable': [],
+        'not_found': [(sym, 'not found/delisted') for sym in sorted(not_found)],
+        'inactive': [(sym, 'inactive') for sym in sorted(inactive)],
+        'not_tradable': [(sym, 'not tradable') for sym in sorted(not_tradable)],
         'halted': [],
-        'suspended': []
+        'suspended': [(sym, f"status: {(assets[sym].get('status') or 'unknown').lower()}")
+                      for sym in sorted(suspended)]
     }
     
-    valid_symbols = []
-    
-    print(f"Checking status for each symbol...\n")
-    checked = 0
-    start_time = time.time()
-    
-    for symbol in symbols:
-        checked += 1
-        
-        try:
-            asset = trading_client.get_asset(symbol)
-            
-            # Check various statuses
-            status = asset.status.lower() if asset.status else 'unknown'
-            tradable = asset.tradable if hasattr(asset, 'tradable') else True
-            
-            if status == 'inactive':
-                issues['inactive'].append((symbol, 'inactive'))
-            elif not tradable:
-                issues['not_tradable'].append((symbol, 'not tradable'))
-            elif status not in ['active']:
-                issues['suspended'].append((symbol, f'status: {status}'))
-            else:
-                valid_symbols.append(symbol)
-        
-        except Exception as e:
-            error_msg = str(e).lower()
-            if 'not found' in error_msg or '404' in error_msg:
-                issues['not_found'].append((symbol, 'not found/delisted'))
-            else:
-                issues['not_found'].append((symbol, str(e)[:50]))
-        
-        # Progress update every 50 symbols
-        if checked % 50 == 0:
-            percent = (checked / len(symbols)) * 100
-            elapsed = time.time() - start_time
-            rate = checked / elapsed if elapsed > 0 else 0
-            remaining = (len(symbols) - checked) / rate if rate > 0 else 0
-            print(f"  Checked {checked}/{len(symbols)} ({percent:.1f}%) | "
-                  f"Valid: {len(valid_symbols)} | "
-                  f"Issues: {sum(len(v) for v in issues.values())} | "
-                  f"ETA: {remaining/60:.1f}min", end='\r')
-        
-        # Rate limiting
-        time.sleep(0.1)
-    
-    print()  # New line after progress
-    
     # Print results
     print(f"\n{'='*80}")
     print("CHECK RESULTS")
@@ -149,13 +121,6 @@ def check_halted_delisted():
     return all_issues
 
 if __name__ == '__main__':
-    try:
-        from alpaca.trading.client import TradingClient
-    except ImportError:
-        print("❌ ERROR: alpaca-py not installed!")
-        print("Install it with: pip install alpaca-py")
-        exit(1)
-    
     issues = check_halted_delisted()
     
     if issues:
@@ -1,7 +1,8 @@
 """
 Check which low-data symbols are in the database
 """
-from database import get_symbols_with_data, get_bar_count
+from database import get_connection, get_symbols_with_data
+import sys
 
 # List of symbols with insufficient 1-minute data
 LOW_DATA_SYMBOLS = [
@@ -21,31 +22,41 @@ LOW_DATA_SYMBOLS = [
     'NOA', 'DHX', 'SJT', 'ONL', 'MTUS', 'ORN'
 ]
 
-# Normalize to uppercase set for fast lookup
-LOW_DATA_SYMBOLS_SET = {s.upper() for s in LOW_DATA_SYMBOLS}
+# Normalize to an uppercase frozenset of interned strings for fast lookup
+LOW_DATA_SYMBOLS_SET = frozenset(sys.intern(s.upper()) for s in LOW_DATA_SYMBOLS)
 
 # Get symbols in database
-db_symbols = get_symbols_with_data('1Min')
-db_symbols_set = set(s.upper() for s in db_symbols)
+db_symbols_set = get_symbols_with_data('1Min', as_set=True)
 
 # Find matches
-matches = [s for s in LOW_DATA_SYMBOLS_SET if s in db_symbols_set]
+matches = sorted(LOW_DATA_SYMBOLS_SET & db_symbols_set)
 
 print("=" * 80)
 print("CHECKING FOR LOW-DATA SYMBOLS")
 print("=" * 80)
 print(f"\nTotal low-data symbols in list: {len(LOW_DATA_SYMBOLS)}")
-print(f"Total symbols in database: {len(db_symbols)}")
+print(f"Total symbols in database: {len(db_symbols_set)}")
 print(f"\nLow-data symbols found in database: {len(matches)}")
-print(f"Percentage of database: {(len(matches)/len(db_symbols)*100):.1f}%")
+print(f"Percentage of database: {(len(matches)/len(db_symbols_set)*100):.1f}%")
 
 if matches:
     print(f"\nFound in database:")
     # Show symbols with their bar counts
     print(f"\n{'Symbol':<10} {'Bar Count':<15} {'Reason'}")
     print("-" * 80)
-    for symbol in sorted(matches):
-        bar_count = get_bar_count(symbol, '1Min')
+    # Bar counts for all matches in one grouped query
+    conn = get_connection()
+    placeholders = ','.join('?' * len(matches))
+    bar_counts = dict(conn.execute(f'''
+        SELECT symbol, COUNT(*)
+        FROM bars
+        WHERE timeframe = '1Min' AND symbol IN ({placeholders})
+        GROUP BY symbol
+    ''', matches).fetchall())
+    conn.close()
+    
+    for symbol in matches:
+        bar_count = bar_counts.get(symbol, 0)
         print(f"{symbol:<10} {bar_count:<15,} Insufficient 1-minute data")
     
     print(f"\n{'='*80}")
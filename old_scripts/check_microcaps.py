@@ -2,6 +2,7 @@
 Check microcap symbols in the database and their volume
 """
 from database import get_connection, get_symbols_with_data
+import sys
 
 # List of microcap examples to check/remove
 MICROCAP_SYMBOLS = [
@@ -9,23 +10,22 @@ MICROCAP_SYMBOLS = [
     'OPAD', 'SHCO', 'SOUL', 'STEM', 'TBI', 'VFRC', 'XIFR', 'YALA', 'ZVIA'
 ]
 
-# Normalize to uppercase
-MICROCAP_SYMBOLS_SET = {s.upper() for s in MICROCAP_SYMBOLS}
+# Normalize to an uppercase frozenset of interned strings for fast lookup
+MICROCAP_SYMBOLS_SET = frozenset(sys.intern(s.upper()) for s in MICROCAP_SYMBOLS)
 
 # Get symbols in database
-db_symbols = get_symbols_with_data('1Min')
-db_symbols_set = set(s.upper() for s in db_symbols)
+db_symbols_set = get_symbols_with_data('1Min', as_set=True)
 
 # Find matches
-matches = [s for s in MICROCAP_SYMBOLS_SET if s in db_symbols_set]
+matches = sorted(MICROCAP_SYMBOLS_SET & db_symbols_set)
 
 print("=" * 80)
 print("CHECKING FOR MICROCAPS")
 print("=" * 80)
 print(f"\nTotal microcap symbols in list: {len(MICROCAP_SYMBOLS)}")
-print(f"Total symbols in database: {len(db_symbols)}")
+print(f"Total symbols in database: {len(db_symbols_set)}")
 print(f"\nMicrocap symbols found in database: {len(matches)}")
-print(f"Percentage of database: {(len(matches)/len(db_symbols)*100):.1f}%")
+print(f"Percentage of database: {(len(matches)/len(db_symbols_set)*100):.1f}%")
 
 if matches:
     print(f"\nFound in database: {', '.join(matches)}")
@@ -41,7 +41,7 @@ if matches:
     microcaps_to_remove = []
     microcaps_to_keep = []
     
-    for symbol in sorted(matches):
+    for symbol in matches:
         # Get latest trading day's total volume
         cursor.execute('''
             SELECT SUM(volume) as daily_volume, COUNT(*) as bar_count,
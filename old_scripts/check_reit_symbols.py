@@ -2,6 +2,7 @@
 Check which REITs are in the database and their average daily volume
 """
 from database import get_connection, get_symbols_with_data
+import sys
 
 # List of low-vol/low-volume REITs to check/remove
 REIT_SYMBOLS = [
@@ -10,23 +11,22 @@ REIT_SYMBOLS = [
     'PINE', 'RITM', 'STWD'
 ]
 
-# Normalize to uppercase
-REIT_SYMBOLS_SET = {s.upper() for s in REIT_SYMBOLS}
+# Normalize to an uppercase frozenset of interned strings for fast lookup
+REIT_SYMBOLS_SET = frozenset(sys.intern(s.upper()) for s in REIT_SYMBOLS)
 
 # Get symbols in database
-db_symbols = get_symbols_with_data('1Min')
-db_symbols_set = set(s.upper() for s in db_symbols)
+db_symbols_set = get_symbols_with_data('1Min', as_set=True)
 
 # Find matches
-matches = [s for s in REIT_SYMBOLS_SET if s in db_symbols_set]
+matches = sorted(REIT_SYMBOLS_SET & db_symbols_set)
 
 print("=" * 80)
 print("CHECKING FOR LOW-VOLUME REITs")
 print("=" * 80)
 print(f"\nTotal REIT symbols in list: {len(REIT_SYMBOLS)}")
-print(f"Total symbols in database: {len(db_symbols)}")
+print(f"Total symbols in database: {len(db_symbols_set)}")
 print(f"\nREIT symbols found in database: {len(matches)}")
-print(f"Percentage of database: {(len(matches)/len(db_symbols)*100):.1f}%")
+print(f"Percentage of database: {(len(matches)/len(db_symbols_set)*100):.1f}%")
 
 if matches:
     print(f"\nFound in database: {', '.join(matches)}")
@@ -43,19 +43,26 @@ if matches:
     reits_to_keep = []
     volume_threshold = 4_000_000  # 4M shares
     
-    for symbol in sorted(matches):
-        # Get latest trading day's bars to calculate daily volume
-        cursor.execute('''
-            SELECT SUM(volume) as daily_volume, COUNT(*) as bar_count,
-                   datetime(MIN(timestamp), 'unixepoch') as date
+    # Latest trading day's volume for every matched REIT in one query (integer UTC day buckets)
+    placeholders = ','.join('?' * len(matches))
+    cursor.execute(f'''
+        SELECT symbol, daily_volume, bar_count, date FROM (
+            SELECT symbol, SUM(volume) AS daily_volume, COUNT(*) AS bar_count,
+                   datetime(MIN(timestamp), 'unixepoch') AS date,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY symbol ORDER BY timestamp / 86400 DESC
+                   ) AS rn
             FROM bars
-            WHERE symbol = ? AND timeframe = '1Min'
-            GROUP BY DATE(datetime(timestamp, 'unixepoch'))
-            ORDER BY date DESC
-            LIMIT 1
-        ''', (symbol,))
-        
-        row = cursor.fetchone()
+            WHERE timeframe = '1Min' AND symbol IN ({placeholders})
+            GROUP BY symbol, timestamp / 86400
+        )
+        WHERE rn = 1
+    ''', matches)
+    latest_day = {row[0]: row[1:] for row in cursor.fetchall()}
+    
+    # Classify from the fetched rows; no further queries
+    for symbol in matches:
+        row = latest_day.get(symbol)
         if row and row[0]:
             daily_volume = row[0] or 0
             bar_count = row[1] or 0
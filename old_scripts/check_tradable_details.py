@@ -3,6 +3,7 @@ Check which symbols might be problematic for trading - analyze tradability detai
 """
 from alpaca.trading.client import TradingClient
 from database import get_symbols_with_data, get_latest_bar
+from remove_special_symbols import classify_symbol
 import yaml
 import time
 
@@ -36,10 +37,15 @@ def analyze_symbols():
     
     valid_symbols = []
     
-    # Categorize by symbol pattern
-    preferred_patterns = [s for s in symbols if '.' in s and not s.endswith('.U') and not s.endswith('.WS')]
-    warrants = [s for s in symbols if '.WS' in s]
-    units = [s for s in symbols if '.U' in s]
+    # Categorize by symbol pattern in one regex pass
+    patterns = {'preferred': [], 'warrant': [], 'unit': []}
+    for s in symbols:
+        category = classify_symbol(s)
+        if category:
+            patterns[category].append(s)
+    preferred_patterns = patterns['preferred']
+    warrants = patterns['warrant']
+    units = patterns['unit']
     
     issues['preferred_shares'] = preferred_patterns
     issues['warrants'] = warrants
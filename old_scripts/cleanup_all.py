@@ -0,0 +1,100 @@
+"""
+Run every list-based symbol cleanup in a single pass.
+
+Unions the symbol lists from the remove_* scripts (low-data symbols,
+microcaps, CEFs/bond funds, ADRs, SPAC remnants, and REITs below the volume
+threshold) and deletes them all in one transaction, instead of running each
+script's own lookup and delete one after another.
+"""
+from database import get_connection, get_symbols_with_data, find_symbols_with_data, remove_symbols
+from remove_low_data_symbols import LOW_DATA_SYMBOLS_SET
+from remove_microcaps import MICROCAP_SYMBOLS_SET
+from remove_additional_cefs import CEF_SYMBOLS_SET as ADDITIONAL_CEF_SYMBOLS_SET
+from remove_cef_bond_funds import CEF_SYMBOLS_SET as CEF_BOND_FUND_SYMBOLS_SET
+from remove_adrs import ADR_SYMBOLS_SET
+from remove_spac_remnants import SPAC_SYMBOLS_SET
+from remove_low_volume_reits import REIT_SYMBOLS_SET, VOLUME_THRESHOLD, latest_day_volumes
+import sys
+
+# Lists removed unconditionally; REITs are only removed below VOLUME_THRESHOLD
+CATEGORY_SETS = {
+    'Low-data symbols': LOW_DATA_SYMBOLS_SET,
+    'Microcaps': MICROCAP_SYMBOLS_SET,
+    'Additional CEFs': ADDITIONAL_CEF_SYMBOLS_SET,
+    'CEFs/bond funds': CEF_BOND_FUND_SYMBOLS_SET,
+    'ADRs': ADR_SYMBOLS_SET,
+    'SPAC remnants': SPAC_SYMBOLS_SET,
+}
+
+def cleanup_all(vacuum: bool = False):
+    """Remove every listed symbol category from the database in one transaction"""
+    conn = get_connection()
+    
+    print("=" * 80)
+    print("CLEANUP ALL SYMBOL LISTS")
+    print("=" * 80)
+    
+    symbols = get_symbols_with_data('1Min')
+    print(f"\nFound {len(symbols)} symbols in database")
+    
+    # One temp-table join finds which candidates from every list are present
+    candidates = frozenset().union(REIT_SYMBOLS_SET, *CATEGORY_SETS.values())
+    in_db = set(find_symbols_with_data(candidates, '1Min', conn=conn))
+    
+    print(f"\n{'='*80}")
+    print("Symbols to remove by category")
+    print(f"{'='*80}\n")
+    
+    to_remove = set()
+    for name, category in CATEGORY_SETS.items():
+        matched = in_db & category
+        to_remove |= matched
+        print(f"  {name}: {len(matched)}")
+    
+    # REITs need the latest-day volume check first
+    reits_in_db = sorted(in_db & REIT_SYMBOLS_SET)
+    latest_volume = latest_day_volumes(conn.cursor(), reits_in_db) if reits_in_db else {}
+    low_volume_reits = {s for s in reits_in_db if (latest_volume.get(s) or 0) < VOLUME_THRESHOLD}
+    to_remove |= low_volume_reits
+    print(f"  Low-volume REITs (<{VOLUME_THRESHOLD:,}): {len(low_volume_reits)}")
+    
+    if not to_remove:
+        print("\n✓ No listed symbols found. Nothing to remove.")
+        conn.close()
+        return
+    
+    symbols_to_remove = sorted(to_remove)
+    
+    print(f"\n{'='*80}")
+    print(f"Removing {len(symbols_to_remove)} symbols (overlapping lists counted once)")
+    print(f"{'='*80}\n")
+    
+    removed_count, reclaimed = remove_symbols(conn, symbols_to_remove, vacuum=vacuum)
+    
+    print(f"{'='*80}")
+    print("CLEANUP COMPLETE")
+    print(f"{'='*80}")
+    print(f"Removed {removed_count:,} bar records for {len(symbols_to_remove)} symbols")
+    print(f"Symbols remaining: {len(symbols) - len(symbols_to_remove)}")
+    print(f"{'='*80}\n")
+    
+    if vacuum:
+        print(f"VACUUM reclaimed {reclaimed / 1024 / 1024:,.1f} MB\n")
+    
+    conn.close()
+
+if __name__ == '__main__':
+    print("=" * 80)
+    print("Cleanup All Symbol Lists")
+    print("=" * 80)
+    print("\nThis will remove, in one pass:")
+    for name in CATEGORY_SETS:
+        print(f"  - {name}")
+    print(f"  - REITs with <{VOLUME_THRESHOLD:,} daily volume")
+    
+    response = input("\nContinue? (y/n): ").strip().lower()
+    if response != 'y':
+        print("Cancelled.")
+    else:
+        cleanup_all(vacuum='--vacuum' in sys.argv)
+        print("Done!")
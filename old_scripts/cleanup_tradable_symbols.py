@@ -7,63 +7,37 @@ Clean up database to only keep symbols that are:
 
 This removes non-tradable symbols from the database to avoid wasting API calls.
 """
-from database import get_connection, get_symbols_with_data, get_latest_bar
-import requests
-import yaml
-import time
-from typing import List, Tuple
+from database import (get_connection, get_symbols_with_data, get_latest_closes, remove_symbols,
+                      get_asset_cache, save_asset_cache)
+from alpaca_client import fetch_all_assets
+from typing import Dict, Tuple
 
-# Load config
-with open('config.yml', 'r') as f:
-    config = yaml.safe_load(f)
+# Asset metadata younger than this is reused from the asset_cache table
+ASSET_CACHE_TTL = 24 * 60 * 60  # seconds
 
-ALPACA_API_KEY = config['alpaca']['api_key']
-ALPACA_SECRET_KEY = config['alpaca']['api_secret']
-TRADING_URL = config['alpaca']['trading_url']
-
-def get_headers():
-    return {
-        'APCA-API-KEY-ID': ALPACA_API_KEY,
-        'APCA-API-SECRET-KEY': ALPACA_SECRET_KEY
-    }
-
-def check_asset_tradable(symbol: str) -> Tuple[bool, str]:
+def evaluate_asset(asset: Dict) -> Tuple[bool, str]:
     """
-    Check if a symbol is tradable by fetching its asset metadata.
+    Apply the keep criteria to asset metadata.
     
     Returns:
         (is_tradable, reason) tuple
     """
-    headers = get_headers()
-    try:
-        # Use Alpaca's asset endpoint to get metadata
-        url = f'{TRADING_URL}/assets/{symbol}'
-        response = requests.get(url, headers=headers)
-        
-        if response.status_code == 404:
-            return (False, "Symbol not found/delisted")
-        
-        if response.status_code != 200:
-            return (False, f"API error: {response.status_code}")
-        
-        asset = response.json()
-        
-        # Check asset class
-        if asset.get('asset_class') != 'us_equity':
-            return (False, f"Not US equity: {asset.get('asset_class')}")
-        
-        # Check status
-        if asset.get('status') != 'active':
-            return (False, f"Not active: {asset.get('status')}")
-        
-        # Check if tradable
-        if not asset.get('tradable', False):
-            return (False, "Not tradable")
-        
-        return (True, "OK")
-        
-    except Exception as e:
-        return (False, f"Error: {str(e)}")
+    if asset['status'] == 'not_found':
+        return (False, "Symbol not found/delisted")
+    
+    # Check asset class
+    if asset['asset_class'] != 'us_equity':
+        return (False, f"Not US equity: {asset['asset_class']}")
+    
+    # Check status
+    if asset['status'] != 'active':
+        return (False, f"Not active: {asset['status']}")
+    
+    # Check if tradable
+    if not asset['tradable']:
+        return (False, "Not tradable")
+    
+    return (True, "OK")
 
 def cleanup_database(min_price: float = 1.0, max_price: float = 20.0, 
                      check_tradable: bool = True):
@@ -87,6 +61,9 @@ def cleanup_database(min_price: float = 1.0, max_price: float = 20.0,
     print(f"  Tradable: True")
     print(f"  Check tradable via API: {check_tradable}")
     
+    # Asset metadata checked within the last day, reused instead of calling the API
+    cached_assets = get_asset_cache(ASSET_CACHE_TTL) if check_tradable else {}
+    
     # Get all symbols with data
     symbols = get_symbols_with_data('1Min')
     print(f"\nFound {len(symbols)} symbols in database")
@@ -104,11 +81,12 @@ def cleanup_database(min_price: float = 1.0, max_price: float = 20.0,
     print("STEP 1: Checking prices from database")
     print(f"{'='*80}\n")
     
-    # First pass: Check prices from database (no API calls needed)
+    # First pass: Check prices from database (no API calls needed); every
+    # symbol's latest close is loaded with one query
+    latest_closes = get_latest_closes('1Min')
     for i, symbol in enumerate(symbols, 1):
-        latest_bar = get_latest_bar(symbol, '1Min')
-        if latest_bar:
-            price = latest_bar['close']
+        price = latest_closes.get(symbol)
+        if price is not None:
             if price < min_price or price > max_price:
                 symbols_to_remove.append((symbol, f"Price ${price:.2f} outside range"))
                 if i <= 10:
@@ -136,35 +114,41 @@ def cleanup_database(min_price: float = 1.0, max_price: float = 20.0,
         print(f"Checking {len(symbols_to_check)} symbols...\n")
         
         # Second pass: Check tradability via API
-        checked = 0
-        start_time = time.time()
-        
-        for i, (symbol, price) in enumerate(symbols_to_check, 1):
-            checked += 1
-            
-            is_tradable, reason = check_asset_tradable(symbol)
+        # Recently checked symbols are answered from asset_cache; misses are
+        # resolved from one bulk /v2/assets listing instead of a GET per symbol
+        misses = [symbol for symbol, _ in symbols_to_check if symbol not in cached_assets]
+        print(f"Cached: {len(symbols_to_check) - len(misses)} | To look up: {len(misses)}\n")
+        fetched_assets = {}
+        listed_assets = {}
+        if misses:
+            listed_assets = fetch_all_assets()
+            print(f"Fetched {len(listed_assets):,} US equity assets from Alpaca\n")
+        
+        removed_before = len(symbols_to_remove)
+        for symbol, _ in symbols_to_check:
+            if symbol in cached_assets:
+                asset = cached_assets[symbol]
+            else:
+                # Symbols absent from the listing are unknown to Alpaca (delisted)
+                listed = listed_assets.get(symbol)
+                if listed is None:
+                    asset = {'status': 'not_found', 'tradable': False, 'asset_class': None}
+                else:
+                    asset = {'status': listed.get('status'),
+                             'tradable': listed.get('tradable', False),
+                             'asset_class': listed.get('asset_class')}
+                fetched_assets[symbol] = asset
+            is_tradable, reason = evaluate_asset(asset)
             
             if is_tradable:
                 symbols_to_keep.append(symbol)
-                status = "✓ KEEP"
             else:
                 symbols_to_remove.append((symbol, reason))
-                status = "✗ REMOVE"
-            
-            # Progress update
-            percent = (checked / len(symbols_to_check)) * 100
-            elapsed = time.time() - start_time
-            rate = checked / elapsed if elapsed > 0 else 0
-            remaining = (len(symbols_to_check) - checked) / rate if rate > 0 else 0
-            
-            price_str = f"${price:.2f}" if price else "N/A"
-            print(f"[{checked}/{len(symbols_to_check)}] ({percent:.1f}%) {symbol}: {price_str} - {status} ({reason}) | "
-                  f"ETA: {remaining/60:.1f}min", end='\r')
-            
-            # Rate limiting - be nice to the API
-            time.sleep(0.1)
         
-        print()  # New line after progress
+        print(f"Checked {len(symbols_to_check)} symbols: {len(symbols_to_keep)} keep, "
+              f"{len(symbols_to_remove) - removed_before} remove")
+        
+        save_asset_cache(fetched_assets)
     
     # Remove symbols from database
     if symbols_to_remove:
@@ -173,14 +157,7 @@ def cleanup_database(min_price: float = 1.0, max_price: float = 20.0,
         print(f"{'='*80}\n")
         print(f"Removing {len(symbols_to_remove)} symbols from database...")
         
-        cursor = conn.cursor()
-        removed_count = 0
-        
-        for symbol, reason in symbols_to_remove:
-            cursor.execute('DELETE FROM bars WHERE symbol = ?', (symbol,))
-            removed_count += cursor.rowcount
-        
-        conn.commit()
+        removed_count, _ = remove_symbols(conn, [symbol for symbol, _ in symbols_to_remove])
         
         print(f"✓ Removed {removed_count} bar records for {len(symbols_to_remove)} symbols")
         
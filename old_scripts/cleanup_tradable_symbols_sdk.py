@@ -10,6 +10,7 @@ Filters out symbols that are:
 """
 from alpaca.trading.client import TradingClient
 from database import get_connection, get_symbols_with_data, get_latest_bar
+from rate_limit import trading_limiter
 import yaml
 import time
 
@@ -66,6 +67,7 @@ def cleanup_database_sdk(min_price: float = 1.0, max_price: float = 20.0):
         
         try:
             # Get asset metadata (ChatGPT's approach)
+            trading_limiter.acquire()
             asset = trading_client.get_asset(symbol)
             
             # Check all criteria
@@ -110,9 +112,6 @@ def cleanup_database_sdk(min_price: float = 1.0, max_price: float = 20.0):
         
         print(f"[{checked}/{len(symbols)}] ({percent:.1f}%) {symbol}: {status} ({reason[:30]}) | "
               f"ETA: {remaining/60:.1f}min", end='\r')
-        
-        # Rate limiting
-        time.sleep(0.1)
     
     print()  # New line after progress
     
@@ -2,12 +2,27 @@
 Fetch complete 14 days of 1-minute data for all symbols currently in database.
 This will fill any gaps automatically since the database uses INSERT OR IGNORE.
 """
-from fetch_historical_data import fetch_bars
-from database import init_database, insert_bars_batch, get_symbols_with_data
+from fetch_historical_data import fetch_bars_multi
+from database import init_database, get_symbols_with_data
+from bar_writer import BarWriter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
+from typing import List
 import time
 
-def fetch_full_14_days():
+# Requests in flight at once; fetch_bars_multi paces every request through
+# rate_limit.data_limiter, so the pool as a whole stays under Alpaca's limit
+MAX_WORKERS = 12
+# Symbols per multi-symbol bars request
+CHUNK_SIZE = 100
+
+def fetch_chunk(chunk: List[str], target_start: datetime, target_end: datetime):
+    """Fetch one chunk of symbols' bars without touching the DB. Safe to run from worker threads."""
+    chunk_start = time.time()
+    bars = fetch_bars_multi(chunk, '1Min', target_start, target_end)
+    return bars, time.time() - chunk_start
+
+def fetch_full_14_days(max_workers: int = MAX_WORKERS):
     """Fetch complete 14 days of data for all symbols in database"""
     # Initialize database
     print("Initializing database...")
@@ -33,49 +48,59 @@ def fetch_full_14_days():
         return
     
     print(f"Found {len(symbols)} symbols in database")
-    print(f"Fetching complete 14-day data for each symbol...\n")
+    print(f"Fetching complete 14-day data in chunks of {CHUNK_SIZE} symbols...\n")
     
     total_bars = 0
     successful = 0
     failed = 0
     start_time = time.time()
     
-    for i, symbol in enumerate(symbols, 1):
-        try:
-            percent = (i / len(symbols)) * 100
+    # One request per chunk of symbols; HTTP fetches overlap on the pool while
+    # a single BarWriter thread commits finished chunks behind them
+    chunks = [symbols[i:i + CHUNK_SIZE] for i in range(0, len(symbols), CHUNK_SIZE)]
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    writer = BarWriter().start()
+    futures = {executor.submit(fetch_chunk, chunk, target_start, target_end): chunk for chunk in chunks}
+    done_symbols = 0
+    
+    try:
+        for future in as_completed(futures):
+            chunk = futures[future]
+            done_symbols += len(chunk)
+            percent = (done_symbols / len(symbols)) * 100
             elapsed = time.time() - start_time
-            rate = i / elapsed if elapsed > 0 else 0
-            remaining = (len(symbols) - i) / rate if rate > 0 else 0
-            
-            print(f"[{i}/{len(symbols)}] ({percent:.1f}%) {symbol}...", end=' ', flush=True)
-            
-            # Fetch full 14 days
-            symbol_start = time.time()
-            bars = fetch_bars(symbol, '1Min', target_start, target_end)
-            fetch_time = time.time() - symbol_start
-            
-            if bars:
-                # Insert into database (INSERT OR IGNORE handles duplicates)
-                inserted = insert_bars_batch(bars)
-                total_bars += inserted
-                successful += 1
-                print(f"✓ {len(bars):,} bars ({inserted:,} new) in {fetch_time:.1f}s | "
-                      f"Total: {total_bars:,} | "
-                      f"ETA: {remaining/60:.1f}min")
-            else:
-                failed += 1
-                print(f"✗ No data | ETA: {remaining/60:.1f}min")
+            rate = done_symbols / elapsed if elapsed > 0 else 0
+            remaining = (len(symbols) - done_symbols) / rate if rate > 0 else 0
             
-            # Rate limiting
-            time.sleep(0.2)
+            line = f"[{done_symbols}/{len(symbols)}] ({percent:.1f}%) {chunk[0]}..{chunk[-1]}..."
             
-        except KeyboardInterrupt:
-            print("\n\nInterrupted by user. Stopping...")
-            break
-        except Exception as e:
-            failed += 1
-            print(f"✗ Error: {e} | ETA: {remaining/60:.1f}min")
-            continue
+            try:
+                bars, fetch_time = future.result()
+                with_data = len({bar[0] for bar in bars})
+                successful += with_data
+                failed += len(chunk) - with_data
+                
+                if bars:
+                    # Queue for the writer thread (INSERT OR IGNORE handles duplicates)
+                    writer.put(bars)
+                    print(f"{line} ✓ {len(bars):,} bars for {with_data}/{len(chunk)} symbols "
+                          f"in {fetch_time:.1f}s | "
+                          f"Inserted so far: {writer.inserted:,} | "
+                          f"ETA: {remaining/60:.1f}min")
+                else:
+                    print(f"{line} ✗ No data | ETA: {remaining/60:.1f}min")
+                
+            except Exception as e:
+                failed += len(chunk)
+                print(f"{line} ✗ Error: {e} | ETA: {remaining/60:.1f}min")
+                continue
+    except KeyboardInterrupt:
+        print("\n\nInterrupted by user. Stopping...")
+        executor.shutdown(wait=False, cancel_futures=True)
+    finally:
+        executor.shutdown(wait=True)
+        # Drain whatever is still queued before reporting totals
+        total_bars = writer.close()
     
     elapsed_total = time.time() - start_time
     
@@ -3,18 +3,34 @@ Fetch complete 14 days of 1-minute data for all symbols currently in database.
 Resume from a specific symbol.
 This will fill any gaps automatically since the database uses INSERT OR IGNORE.
 """
-from fetch_historical_data import fetch_bars
-from database import init_database, insert_bars_batch, get_symbols_with_data
+from fetch_historical_data import fetch_bars_multi
+from database import init_database, get_symbols_with_data
+from bar_writer import BarWriter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
+from typing import List
 import time
 import sys
 
-def fetch_full_14_days_resume(start_symbol: str = None):
+# Requests in flight at once; fetch_bars_multi paces every request through
+# rate_limit.data_limiter, so the pool as a whole stays under Alpaca's limit
+MAX_WORKERS = 12
+# Symbols per multi-symbol bars request
+CHUNK_SIZE = 100
+
+def fetch_chunk(chunk: List[str], target_start: datetime, target_end: datetime):
+    """Fetch one chunk of symbols' bars without touching the DB. Safe to run from worker threads."""
+    chunk_start = time.time()
+    bars = fetch_bars_multi(chunk, '1Min', target_start, target_end)
+    return bars, time.time() - chunk_start
+
+def fetch_full_14_days_resume(start_symbol: str = None, max_workers: int = MAX_WORKERS):
     """
     Fetch complete 14 days of data for all symbols in database.
     
     Args:
         start_symbol: Symbol to start from (None = start from beginning)
+        max_workers: Concurrent chunk requests (default: 12)
     """
     # Initialize database
     print("Initializing database...")
@@ -61,7 +77,7 @@ def fetch_full_14_days_resume(start_symbol: str = None):
     if start_symbol:
         print(f"Processing {len(symbols)} symbols starting from {start_symbol}")
     else:
-        print(f"Fetching complete 14-day data for each symbol...")
+        print(f"Fetching complete 14-day data in chunks of {CHUNK_SIZE} symbols...")
     print()
     
     total_bars = 0
@@ -69,45 +85,63 @@ def fetch_full_14_days_resume(start_symbol: str = None):
     failed = 0
     start_time = time.time()
     
-    for i, symbol in enumerate(symbols, 1):
-        actual_index = start_index + i if start_index > 0 else i
-        try:
+    # One request per chunk of symbols; HTTP fetches overlap on the pool while
+    # a single BarWriter thread commits finished chunks behind them
+    chunks = [symbols[i:i + CHUNK_SIZE] for i in range(0, len(symbols), CHUNK_SIZE)]
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    writer = BarWriter().start()
+    futures = {executor.submit(fetch_chunk, chunk, target_start, target_end): chunk for chunk in chunks}
+    # Symbols whose chunk fetched without error; only these are safe to resume past
+    processed = set()
+    failed_chunks = []
+    done_symbols = 0
+    
+    try:
+        for future in as_completed(futures):
+            chunk = futures[future]
+            done_symbols += len(chunk)
+            actual_index = start_index + done_symbols
             percent = (actual_index / (start_index + len(symbols))) * 100
             elapsed = time.time() - start_time
-            rate = i / elapsed if elapsed > 0 else 0
-            remaining = (len(symbols) - i) / rate if rate > 0 else 0
-            
-            print(f"[{actual_index}/{start_index + len(symbols)}] ({percent:.1f}%) {symbol}...", end=' ', flush=True)
-            
-            # Fetch full 14 days
-            symbol_start = time.time()
-            bars = fetch_bars(symbol, '1Min', target_start, target_end)
-            fetch_time = time.time() - symbol_start
-            
-            if bars:
-                # Insert into database (INSERT OR IGNORE handles duplicates)
-                inserted = insert_bars_batch(bars)
-                total_bars += inserted
-                successful += 1
-                print(f"✓ {len(bars):,} bars ({inserted:,} new) in {fetch_time:.1f}s | "
-                      f"Total: {total_bars:,} | "
-                      f"ETA: {remaining/60:.1f}min")
-            else:
-                failed += 1
-                print(f"✗ No data | ETA: {remaining/60:.1f}min")
+            rate = done_symbols / elapsed if elapsed > 0 else 0
+            remaining = (len(symbols) - done_symbols) / rate if rate > 0 else 0
             
-            # Rate limiting
-            time.sleep(0.2)
+            line = f"[{actual_index}/{start_index + len(symbols)}] ({percent:.1f}%) {chunk[0]}..{chunk[-1]}..."
             
-        except KeyboardInterrupt:
-            print("\n\nInterrupted by user. Stopping...")
-            print(f"\nTo resume from {symbol}, run:")
-            print(f"  python fetch_full_14_days_resume.py {symbol}")
-            break
-        except Exception as e:
-            failed += 1
-            print(f"✗ Error: {e} | ETA: {remaining/60:.1f}min")
-            continue
+            try:
+                bars, fetch_time = future.result()
+                processed.update(chunk)
+                with_data = len({bar[0] for bar in bars})
+                successful += with_data
+                failed += len(chunk) - with_data
+                
+                if bars:
+                    # Queue for the writer thread (INSERT OR IGNORE handles duplicates)
+                    writer.put(bars)
+                    print(f"{line} ✓ {len(bars):,} bars for {with_data}/{len(chunk)} symbols "
+                          f"in {fetch_time:.1f}s | "
+                          f"Inserted so far: {writer.inserted:,} | "
+                          f"ETA: {remaining/60:.1f}min")
+                else:
+                    print(f"{line} ✗ No data | ETA: {remaining/60:.1f}min")
+                
+            except Exception as e:
+                failed += len(chunk)
+                failed_chunks.append(chunk)
+                print(f"{line} ✗ Error: {e} | ETA: {remaining/60:.1f}min")
+                continue
+    except KeyboardInterrupt:
+        print("\n\nInterrupted by user. Stopping...")
+        executor.shutdown(wait=False, cancel_futures=True)
+        # Chunks finish out of order; resume from the first symbol not yet processed
+        unfinished = [sym for sym in symbols if sym not in processed]
+        if unfinished:
+            print(f"\nTo resume from {unfinished[0]}, run:")
+            print(f"  python fetch_full_14_days_resume.py {unfinished[0]}")
+    finally:
+        executor.shutdown(wait=True)
+        # Drain whatever is still queued before reporting totals
+        total_bars = writer.close()
     
     elapsed_total = time.time() - start_time
     
@@ -122,6 +156,13 @@ def fetch_full_14_days_resume(start_symbol: str = None):
     print(f"  Time elapsed: {elapsed_total/60:.1f} minutes")
     if successful > 0:
         print(f"  Average: {elapsed_total/successful:.2f} seconds per symbol")
+    if failed_chunks:
+        print(f"  Failed chunks ({len(failed_chunks)}, nothing written for these):")
+        for chunk in sorted(failed_chunks):
+            print(f"    {chunk[0]}..{chunk[-1]} ({len(chunk)} symbols)")
+        first_failed = min(chunk[0] for chunk in failed_chunks)
+        print(f"  To retry them, run:")
+        print(f"    python fetch_full_14_days_resume.py {first_failed}")
     print(f"{'='*80}\n")
 
 if __name__ == '__main__':
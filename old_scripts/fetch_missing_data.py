@@ -3,42 +3,36 @@ Fetch missing historical data to fill gaps and ensure 14 full days of data
 for all $1-$20 symbols.
 """
 from fetch_historical_data import fetch_bars
-from database import init_database, insert_bars_batch, get_symbols_with_data, get_data_range, get_bars
-import requests
-import yaml
+from database import (init_database, get_symbols_with_data,
+                      get_coverage_summary, iter_symbol_timestamps)
+from bar_writer import BarWriter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 import time
-from typing import List, Tuple, Optional
+from typing import Iterable, List, Tuple, Optional
+from itertools import groupby
+from operator import itemgetter
 
-# Load config
-with open('config.yml', 'r') as f:
-    config = yaml.safe_load(f)
 
-ALPACA_API_KEY = config['alpaca']['api_key']
-ALPACA_SECRET_KEY = config['alpaca']['api_secret']
-BASE_URL = config['alpaca']['data_url']
-TRADING_URL = config['alpaca']['trading_url']
-
-def get_headers():
-    return {
-        'APCA-API-KEY-ID': ALPACA_API_KEY,
-        'APCA-API-SECRET-KEY': ALPACA_SECRET_KEY
-    }
-
-def get_missing_date_ranges(symbol: str, timeframe: str, target_start: datetime, target_end: datetime) -> List[Tuple[datetime, datetime]]:
+def get_missing_date_ranges(coverage: Optional[Tuple[int, int, int]], timestamps: Iterable[int],
+                            target_start: datetime, target_end: datetime) -> List[Tuple[datetime, datetime]]:
     """
     Identify missing date ranges for a symbol within the target date range.
     
+    Args:
+        coverage: (min_ts, max_ts, bar_count) for the symbol as returned by
+            get_coverage_summary (all-time range, bars within the target range),
+            or None if it has no bars at all
+        timestamps: The symbol's bar timestamps within the target range, in ascending order
+    
     Returns list of (start, end) tuples for missing ranges.
     """
-    existing_range = get_data_range(symbol, timeframe)
-    
-    if not existing_range:
-        # No data exists, need to fetch entire range
+    if not coverage or not coverage[2]:
+        # No bars in the target range, need to fetch entire range
         return [(target_start, target_end)]
     
-    existing_start = datetime.fromtimestamp(existing_range[0])
-    existing_end = datetime.fromtimestamp(existing_range[1])
+    existing_start = datetime.fromtimestamp(coverage[0])
+    existing_end = datetime.fromtimestamp(coverage[1])
     
     missing_ranges = []
     
@@ -46,33 +40,22 @@ def get_missing_date_ranges(symbol: str, timeframe: str, target_start: datetime,
     if existing_start > target_start:
         missing_ranges.append((target_start, existing_start - timedelta(minutes=1)))
     
-    # Check for gaps within existing data by looking at actual bars
-    existing_bars = get_bars(symbol, timeframe, 
-                            start_time=int(target_start.timestamp()),
-                            end_time=int(target_end.timestamp()))
-    
-    if not existing_bars:
-        # Have range info but no bars in target range, fetch all
-        return [(target_start, target_end)]
-    
-    # Sort bars by timestamp
-    existing_bars.sort(key=lambda x: x['timestamp'])
-    
-    # Check for gaps in the data (more than 2 hours gap suggests missing data)
+    # Check for gaps in the data (more than 2 hours gap suggests missing data).
+    # Scan raw epoch seconds; datetimes are only built for emitted ranges.
     max_gap_minutes = 120
-    last_timestamp = None
-    
-    for bar in existing_bars:
-        bar_time = datetime.fromtimestamp(bar['timestamp'])
-        if last_timestamp:
-            gap_minutes = (bar_time - last_timestamp).total_seconds() / 60
-            if gap_minutes > max_gap_minutes:
-                # Significant gap found
-                gap_start = last_timestamp + timedelta(minutes=1)
-                gap_end = bar_time - timedelta(minutes=1)
-                if gap_start < gap_end and gap_start >= target_start and gap_end <= target_end:
-                    missing_ranges.append((gap_start, gap_end))
-        last_timestamp = bar_time
+    gap_threshold = max_gap_minutes * 60
+    target_start_ts = int(target_start.timestamp())
+    target_end_ts = int(target_end.timestamp())
+    prev_ts = None
+    
+    for ts in timestamps:
+        if prev_ts is not None and ts - prev_ts > gap_threshold:
+            # Significant gap found
+            gap_start_ts = prev_ts + 60
+            gap_end_ts = ts - 60
+            if gap_start_ts < gap_end_ts and gap_start_ts >= target_start_ts and gap_end_ts <= target_end_ts:
+                missing_ranges.append((datetime.fromtimestamp(gap_start_ts), datetime.fromtimestamp(gap_end_ts)))
+        prev_ts = ts
     
     # Check for missing data after existing end
     if existing_end < target_end:
@@ -80,24 +63,26 @@ def get_missing_date_ranges(symbol: str, timeframe: str, target_start: datetime,
     
     return missing_ranges
 
-def analyze_data_coverage(symbol: str, target_start: datetime, target_end: datetime) -> dict:
+def is_fully_covered(coverage: Optional[Tuple[int, int, int]],
+                     target_start: datetime, target_end: datetime) -> bool:
+    """True if the symbol's existing bars span every day of the target range"""
+    if not coverage or not coverage[2]:
+        return False
+    return (datetime.fromtimestamp(coverage[0]).date() <= target_start.date() and
+            datetime.fromtimestamp(coverage[1]).date() >= target_end.date())
+
+def analyze_data_coverage(coverage: Optional[Tuple[int, int, int]], timestamps: Iterable[int],
+                          target_start: datetime, target_end: datetime) -> dict:
     """Analyze what data exists vs what's needed"""
-    existing_range = get_data_range(symbol, '1Min')
-    
-    if not existing_range:
+    if not coverage:
         return {
             'has_data': False,
             'coverage_pct': 0.0,
             'missing_ranges': [(target_start, target_end)]
         }
     
-    existing_start = datetime.fromtimestamp(existing_range[0])
-    existing_end = datetime.fromtimestamp(existing_range[1])
-    
-    # Count existing bars in target range
-    existing_bars = get_bars(symbol, '1Min',
-                            start_time=int(target_start.timestamp()),
-                            end_time=int(target_end.timestamp()))
+    existing_start = datetime.fromtimestamp(coverage[0])
+    existing_end = datetime.fromtimestamp(coverage[1])
     
     # Estimate expected bars (assuming ~390 bars per trading day, 14 days = ~2730 bars)
     # But we'll use a simpler approach - check date coverage
@@ -105,56 +90,62 @@ def analyze_data_coverage(symbol: str, target_start: datetime, target_end: datet
     coverage_days = (min(existing_end.date(), target_end.date()) - max(existing_start.date(), target_start.date())).days + 1
     coverage_pct = (coverage_days / target_days) * 100 if target_days > 0 else 0
     
-    missing_ranges = get_missing_date_ranges(symbol, '1Min', target_start, target_end)
+    # Fully covered: skip the per-bar gap scan entirely
+    if is_fully_covered(coverage, target_start, target_end):
+        missing_ranges = []
+    else:
+        missing_ranges = get_missing_date_ranges(coverage, timestamps, target_start, target_end)
     
     return {
         'has_data': True,
         'existing_start': existing_start,
         'existing_end': existing_end,
         'coverage_pct': coverage_pct,
-        'bar_count': len(existing_bars),
+        'bar_count': coverage[2],
         'missing_ranges': missing_ranges
     }
 
-def fetch_missing_data_for_symbol(symbol: str, timeframe: str, 
-                                   target_start: datetime, target_end: datetime) -> dict:
-    """Fetch missing data for a single symbol"""
+def fetch_missing_data_for_symbol(symbol: str, timeframe: str,
+                                   missing_ranges: List[Tuple[datetime, datetime]],
+                                   writer: BarWriter) -> dict:
+    """
+    Fetch the given missing ranges for a single symbol and queue all of its
+    bars on the shared DB writer as one batch, so they are committed together.
+    Safe to run from worker threads.
+    """
     result = {
         'symbol': symbol,
         'bars_fetched': 0,
-        'bars_inserted': 0,
         'ranges_fetched': 0,
         'errors': []
     }
     
-    # Identify missing ranges
-    missing_ranges = get_missing_date_ranges(symbol, timeframe, target_start, target_end)
-    
     if not missing_ranges:
         return result
     
+    symbol_bars = []
+    
     # Fetch each missing range
     for range_start, range_end in missing_ranges:
         try:
             result['ranges_fetched'] += 1
+            # fetch_bars draws from the process-wide data_limiter; no fixed sleeps
             bars = fetch_bars(symbol, timeframe, range_start, range_end)
             result['bars_fetched'] += len(bars) if bars else 0
             
             if bars:
-                inserted = insert_bars_batch(bars)
-                result['bars_inserted'] += inserted
-                
-            # Rate limiting between ranges
-            time.sleep(0.2)
+                symbol_bars.extend(bars)
             
         except Exception as e:
             result['errors'].append(f"Range {range_start.date()} to {range_end.date()}: {str(e)}")
             continue
     
+    writer.put(symbol_bars)
     return result
 
 def fetch_all_missing_data(days: int = 14, timeframe: str = '1Min',
-                           min_price: float = 1.0, max_price: float = 20.0):
+                           min_price: float = 1.0, max_price: float = 20.0,
+                           max_workers: int = 8):
     """
     Fetch missing historical data to ensure full 14-day coverage for all symbols.
     
@@ -163,6 +154,7 @@ def fetch_all_missing_data(days: int = 14, timeframe: str = '1Min',
         timeframe: Bar timeframe (default: '1Min')
         min_price: Minimum price for symbols (default: 1.0)
         max_price: Maximum price for symbols (default: 20.0)
+        max_workers: Concurrent fetch threads (default: 8)
     """
     # Initialize database
     print("Initializing database...")
@@ -199,8 +191,25 @@ def fetch_all_missing_data(days: int = 14, timeframe: str = '1Min',
     symbols_needing_data = []
     coverage_stats = []
     
+    # Two queries cover every symbol: per-symbol min/max/count, then all
+    # timestamps streamed in (symbol, timestamp) order for the gap scan
+    start_ts = int(target_start.timestamp())
+    end_ts = int(target_end.timestamp())
+    coverage = get_coverage_summary(timeframe, start_ts, end_ts)
+    analyses = {
+        symbol: analyze_data_coverage(cov, (), target_start, target_end)
+        for symbol, cov in coverage.items()
+        if is_fully_covered(cov, target_start, target_end)
+    }
+    # Only stream timestamps when some symbol actually needs a gap scan
+    if len(analyses) < len(coverage):
+        for symbol, rows in groupby(iter_symbol_timestamps(timeframe, start_ts, end_ts), key=itemgetter(0)):
+            if symbol not in analyses:
+                analyses[symbol] = analyze_data_coverage(coverage.get(symbol), (ts for _, ts in rows),
+                                                         target_start, target_end)
+    
     for i, symbol in enumerate(db_symbols, 1):
-        analysis = analyze_data_coverage(symbol, target_start, target_end)
+        analysis = analyses.get(symbol) or analyze_data_coverage(coverage.get(symbol), (), target_start, target_end)
         coverage_stats.append(analysis)
         
         if analysis['missing_ranges']:
@@ -231,51 +240,60 @@ def fetch_all_missing_data(days: int = 14, timeframe: str = '1Min',
     print(f"{'='*80}\n")
     
     total_bars_fetched = 0
-    total_bars_inserted = 0
     successful = 0
     failed = 0
+    completed = 0
     start_time = time.time()
     
-    for i, (symbol, analysis) in enumerate(symbols_needing_data, 1):
-        try:
-            percent = (i / len(symbols_needing_data)) * 100
+    # HTTP fetches run on a thread pool paced by rate_limit.data_limiter;
+    # inserts go through a single writer thread to keep SQLite writes serialized
+    writer = BarWriter().start()
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    futures = {
+        executor.submit(fetch_missing_data_for_symbol, symbol, timeframe, analysis['missing_ranges'], writer): (symbol, analysis)
+        for symbol, analysis in symbols_needing_data
+    }
+    
+    try:
+        for future in as_completed(futures):
+            symbol, analysis = futures[future]
+            completed += 1
+            percent = (completed / len(symbols_needing_data)) * 100
             elapsed = time.time() - start_time
-            rate = i / elapsed if elapsed > 0 else 0
-            remaining = (len(symbols_needing_data) - i) / rate if rate > 0 else 0
+            rate = completed / elapsed if elapsed > 0 else 0
+            remaining = (len(symbols_needing_data) - completed) / rate if rate > 0 else 0
             
-            # Show what's missing
+            # Show what was missing
             missing_days = sum([(end.date() - start.date()).days for start, end in analysis['missing_ranges']])
-            print(f"[{i}/{len(symbols_needing_data)}] ({percent:.1f}%) {symbol}: "
-                  f"coverage {analysis['coverage_pct']:.0f}%, "
-                  f"missing ~{missing_days} days...", end=' ', flush=True)
+            line = (f"[{completed}/{len(symbols_needing_data)}] ({percent:.1f}%) {symbol}: "
+                    f"coverage {analysis['coverage_pct']:.0f}%, "
+                    f"missing ~{missing_days} days...")
             
-            # Fetch missing data
-            result = fetch_missing_data_for_symbol(symbol, timeframe, target_start, target_end)
+            try:
+                result = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"{line} ✗ Error: {e}")
+                continue
             
-            if result['bars_inserted'] > 0:
+            if result['bars_fetched'] > 0:
                 total_bars_fetched += result['bars_fetched']
-                total_bars_inserted += result['bars_inserted']
                 successful += 1
-                print(f"✓ {result['bars_inserted']:,} bars | "
-                      f"Total: {total_bars_inserted:,} | "
+                print(f"{line} ✓ {result['bars_fetched']:,} bars | "
+                      f"Total: {total_bars_fetched:,} | "
                       f"ETA: {remaining/60:.1f}min")
             elif result['errors']:
                 failed += 1
-                print(f"✗ Errors: {len(result['errors'])}")
+                print(f"{line} ✗ Errors: {len(result['errors'])}")
             else:
                 successful += 1
-                print(f"✓ No additional data needed")
-            
-            # Rate limiting
-            time.sleep(0.2)
-            
-        except KeyboardInterrupt:
-            print("\n\nInterrupted by user. Stopping...")
-            break
-        except Exception as e:
-            failed += 1
-            print(f"✗ Error: {e}")
-            continue
+                print(f"{line} ✓ No additional data needed")
+    except KeyboardInterrupt:
+        print("\n\nInterrupted by user. Stopping...")
+        executor.shutdown(wait=False, cancel_futures=True)
+    finally:
+        executor.shutdown(wait=True)
+        total_bars_inserted = writer.close()
     
     elapsed_total = time.time() - start_time
     
@@ -1,7 +1,7 @@
 """
 Quick check of current data coverage
 """
-from database import get_symbols_with_data, get_data_range
+from database import get_connection, get_symbols_with_data
 from datetime import datetime, timedelta
 
 symbols = get_symbols_with_data('1Min')
@@ -13,11 +13,22 @@ print(f"Target date range: {target_start.date()} to {target_end.date()} (14 days
 print(f"\nChecking first 5 symbols:")
 print("-" * 80)
 
-for symbol in symbols[:5]:
-    date_range = get_data_range(symbol, '1Min')
-    if date_range:
-        existing_start = datetime.fromtimestamp(date_range[0])
-        existing_end = datetime.fromtimestamp(date_range[1])
+# Ranges for the first 5 symbols in one grouped query
+conn = get_connection()
+rows = conn.execute('''
+    SELECT symbol, MIN(timestamp), MAX(timestamp)
+    FROM bars
+    WHERE timeframe = '1Min'
+    GROUP BY symbol
+    ORDER BY symbol
+    LIMIT 5
+''').fetchall()
+conn.close()
+
+for symbol, min_ts, max_ts in rows:
+    if min_ts is not None:
+        existing_start = datetime.fromtimestamp(min_ts)
+        existing_end = datetime.fromtimestamp(max_ts)
         days = (existing_end.date() - existing_start.date()).days
         print(f"{symbol}: {existing_start.date()} to {existing_end.date()} ({days} days)")
 
@@ -2,7 +2,8 @@
 Remove ADRs (American Depositary Receipts) from the database.
 ADRs often have terrible volume, show fake premarket gaps, and are dangerous to scalp.
 """
-from database import get_connection, get_symbols_with_data
+from database import get_connection, get_symbols_with_data, find_symbols_with_data, remove_symbols
+import sys
 
 # List of ADRs to remove
 ADR_SYMBOLS = [
@@ -19,13 +20,12 @@ ADR_SYMBOLS = [
     'YSG', 'ZH'
 ]
 
-# Normalize to uppercase set for fast lookup
-ADR_SYMBOLS_SET = {s.upper() for s in ADR_SYMBOLS}
+# Normalize to an uppercase frozenset of interned strings for fast lookup
+ADR_SYMBOLS_SET = frozenset(sys.intern(s.upper()) for s in ADR_SYMBOLS)
 
-def remove_adrs():
+def remove_adrs(vacuum: bool = False):
     """Remove ADRs from database"""
     conn = get_connection()
-    cursor = conn.cursor()
     
     print("=" * 80)
     print("REMOVE ADRs (AMERICAN DEPOSITARY RECEIPTS)")
@@ -40,8 +40,8 @@ def remove_adrs():
     symbols = get_symbols_with_data('1Min')
     print(f"\nFound {len(symbols)} symbols in database")
     
-    # Find ADRs in database
-    adrs_in_db = [s for s in symbols if s.upper() in ADR_SYMBOLS_SET]
+    # Find ADRs in database (joined in SQL against a temp table of candidates)
+    adrs_in_db = find_symbols_with_data(ADR_SYMBOLS_SET, '1Min', conn=conn)
     
     print(f"\nADR symbols to remove: {len(adrs_in_db)}")
     print(f"This represents {(len(adrs_in_db)/len(symbols)*100):.1f}% of your database")
@@ -69,16 +69,11 @@ def remove_adrs():
     print(f"Removing {len(adrs_in_db)} ADR symbols")
     print(f"{'='*80}\n")
     
-    removed_count = 0
-    for symbol in adrs_in_db:
-        cursor.execute('DELETE FROM bars WHERE symbol = ?', (symbol,))
-        removed_count += cursor.rowcount
+    removed_count, reclaimed = remove_symbols(conn, adrs_in_db, vacuum=vacuum)
     
-    conn.commit()
-    
-    # Get remaining count
-    cursor.execute('SELECT COUNT(DISTINCT symbol) FROM bars WHERE timeframe = "1Min"')
-    remaining_symbols = cursor.fetchone()[0]
+    # Remaining count from the symbol list already loaded, instead of a
+    # COUNT(DISTINCT symbol) scan over bars after the delete
+    remaining_symbols = len(symbols) - len(adrs_in_db)
     
     print(f"{'='*80}")
     print("REMOVAL COMPLETE")
@@ -88,6 +83,9 @@ def remove_adrs():
     print(f"Removed {len(adrs_in_db)} ADRs ({(len(adrs_in_db)/(len(adrs_in_db)+remaining_symbols)*100):.1f}% of total)")
     print(f"{'='*80}\n")
     
+    if vacuum:
+        print(f"VACUUM reclaimed {reclaimed / 1024 / 1024:,.1f} MB\n")
+    
     conn.close()
 
 if __name__ == '__main__':
@@ -103,6 +101,6 @@ if __name__ == '__main__':
     if response != 'y':
         print("Cancelled.")
     else:
-        remove_adrs()
+        remove_adrs(vacuum='--vacuum' in sys.argv)
         print("Done!")
 
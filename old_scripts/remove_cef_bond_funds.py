@@ -2,7 +2,8 @@
 Remove Closed-End Funds (CEFs) and Bond Funds from the database.
 These trade thin, barely move intraday, and behave nothing like equities.
 """
-from database import get_connection, get_symbols_with_data
+from database import get_connection, get_symbols_with_data, find_symbols_with_data, remove_symbols
+import sys
 
 # List of CEFs and Bond Funds to remove (from ChatGPT's recommendation)
 CEF_SYMBOLS = [
@@ -32,13 +33,12 @@ CEF_SYMBOLS = [
     'VPV', 'VVR', 'WEA', 'WIA', 'WIW', 'XFLT', 'ZTR'
 ]
 
-# Normalize to uppercase set for fast lookup
-CEF_SYMBOLS_SET = {s.upper() for s in CEF_SYMBOLS}
+# Normalize to an uppercase frozenset of interned strings for fast lookup
+CEF_SYMBOLS_SET = frozenset(sys.intern(s.upper()) for s in CEF_SYMBOLS)
 
-def remove_cef_bond_funds():
+def remove_cef_bond_funds(vacuum: bool = False):
     """Remove CEFs and Bond Funds from database"""
     conn = get_connection()
-    cursor = conn.cursor()
     
     print("=" * 80)
     print("REMOVE CLOSED-END FUNDS (CEFs) AND BOND FUNDS")
@@ -54,8 +54,8 @@ def remove_cef_bond_funds():
     symbols = get_symbols_with_data('1Min')
     print(f"\nFound {len(symbols)} symbols in database")
     
-    # Find CEFs in database
-    cefs_in_db = [s for s in symbols if s.upper() in CEF_SYMBOLS_SET]
+    # Find CEFs in database (joined in SQL against a temp table of candidates)
+    cefs_in_db = find_symbols_with_data(CEF_SYMBOLS_SET, '1Min', conn=conn)
     
     print(f"\nCEF/Bond Fund symbols to remove: {len(cefs_in_db)}")
     print(f"This represents {(len(cefs_in_db)/len(symbols)*100):.1f}% of your database")
@@ -79,16 +79,11 @@ def remove_cef_bond_funds():
     print(f"Removing {len(cefs_in_db)} CEF/Bond Fund symbols")
     print(f"{'='*80}\n")
     
-    removed_count = 0
-    for symbol in cefs_in_db:
-        cursor.execute('DELETE FROM bars WHERE symbol = ?', (symbol,))
-        removed_count += cursor.rowcount
+    removed_count, reclaimed = remove_symbols(conn, cefs_in_db, vacuum=vacuum)
     
-    conn.commit()
-    
-    # Get remaining count
-    cursor.execute('SELECT COUNT(DISTINCT symbol) FROM bars WHERE timeframe = "1Min"')
-    remaining_symbols = cursor.fetchone()[0]
+    # Remaining count from the symbol list already loaded, instead of a
+    # COUNT(DISTINCT symbol) scan over bars after the delete
+    remaining_symbols = len(symbols) - len(cefs_in_db)
     
     print(f"{'='*80}")
     print("REMOVAL COMPLETE")
@@ -98,6 +93,9 @@ def remove_cef_bond_funds():
     print(f"Removed {len(cefs_in_db)} CEFs/Bond Funds ({(len(cefs_in_db)/(len(cefs_in_db)+remaining_symbols)*100):.1f}% of total)")
     print(f"{'='*80}\n")
     
+    if vacuum:
+        print(f"VACUUM reclaimed {reclaimed / 1024 / 1024:,.1f} MB\n")
+    
     conn.close()
 
 if __name__ == '__main__':
@@ -114,6 +112,6 @@ if __name__ == '__main__':
     if response != 'y':
         print("Cancelled.")
     else:
-        remove_cef_bond_funds()
+        remove_cef_bond_funds(vacuum='--vacuum' in sys.argv)
         print("Done!")
 
@@ -1,7 +1,8 @@
 """
 Remove symbols with insufficient 1-minute data from the database.
 """
-from database import get_connection, get_symbols_with_data, get_bar_count
+from database import get_connection, get_symbols_with_data, find_symbols_with_data, remove_symbols
+import sys
 
 # List of symbols with insufficient 1-minute data
 LOW_DATA_SYMBOLS = [
@@ -21,10 +22,10 @@ LOW_DATA_SYMBOLS = [
     'NOA', 'DHX', 'SJT', 'ONL', 'MTUS', 'ORN'
 ]
 
-# Normalize to uppercase set for fast lookup
-LOW_DATA_SYMBOLS_SET = {s.upper() for s in LOW_DATA_SYMBOLS}
+# Normalize to an uppercase frozenset of interned strings for fast lookup
+LOW_DATA_SYMBOLS_SET = frozenset(sys.intern(s.upper()) for s in LOW_DATA_SYMBOLS)
 
-def remove_low_data_symbols():
+def remove_low_data_symbols(vacuum: bool = False):
     """Remove symbols with insufficient 1-minute data"""
     conn = get_connection()
     cursor = conn.cursor()
@@ -41,8 +42,8 @@ def remove_low_data_symbols():
     symbols = get_symbols_with_data('1Min')
     print(f"\nFound {len(symbols)} symbols in database")
     
-    # Find low-data symbols in database
-    low_data_in_db = [s for s in symbols if s.upper() in LOW_DATA_SYMBOLS_SET]
+    # Find low-data symbols in database (joined in SQL against a temp table of candidates)
+    low_data_in_db = find_symbols_with_data(LOW_DATA_SYMBOLS_SET, '1Min', conn=conn)
     
     print(f"\nLow-data symbols to remove: {len(low_data_in_db)}")
     print(f"This represents {(len(low_data_in_db)/len(symbols)*100):.1f}% of your database")
@@ -56,8 +57,17 @@ def remove_low_data_symbols():
     print(f"\n{'='*80}")
     print("Symbols to remove (first 20 with bar counts):")
     print(f"{'='*80}")
-    for symbol in sorted(low_data_in_db)[:20]:
-        bar_count = get_bar_count(symbol, '1Min')
+    # Bar counts for the listed symbols in one grouped query
+    shown = low_data_in_db[:20]
+    placeholders = ','.join('?' * len(shown))
+    cursor.execute(f'''
+        SELECT symbol, COUNT(*) AS bar_count
+        FROM bars
+        WHERE timeframe = '1Min' AND symbol IN ({placeholders})
+        GROUP BY symbol
+        ORDER BY symbol
+    ''', shown)
+    for symbol, bar_count in cursor.fetchall():
         print(f"  {symbol}: {bar_count:,} bars")
     if len(low_data_in_db) > 20:
         print(f"  ... and {len(low_data_in_db) - 20} more")
@@ -67,16 +77,11 @@ def remove_low_data_symbols():
     print(f"Removing {len(low_data_in_db)} low-data symbols")
     print(f"{'='*80}\n")
     
-    removed_count = 0
-    for symbol in low_data_in_db:
-        cursor.execute('DELETE FROM bars WHERE symbol = ?', (symbol,))
-        removed_count += cursor.rowcount
+    removed_count, reclaimed = remove_symbols(conn, low_data_in_db, vacuum=vacuum)
     
-    conn.commit()
-    
-    # Get remaining count
-    cursor.execute('SELECT COUNT(DISTINCT symbol) FROM bars WHERE timeframe = "1Min"')
-    remaining_symbols = cursor.fetchone()[0]
+    # Remaining count from the symbol list already loaded, instead of a
+    # COUNT(DISTINCT symbol) scan over bars after the delete
+    remaining_symbols = len(symbols) - len(low_data_in_db)
     
     print(f"{'='*80}")
     print("REMOVAL COMPLETE")
@@ -86,6 +91,9 @@ def remove_low_data_symbols():
     print(f"Removed {len(low_data_in_db)} low-data symbols ({(len(low_data_in_db)/(len(low_data_in_db)+remaining_symbols)*100):.1f}% of total)")
     print(f"{'='*80}\n")
     
+    if vacuum:
+        print(f"VACUUM reclaimed {reclaimed / 1024 / 1024:,.1f} MB\n")
+    
     conn.close()
 
 if __name__ == '__main__':
@@ -99,6 +107,6 @@ if __name__ == '__main__':
     if response != 'y':
         print("Cancelled.")
     else:
-        remove_low_data_symbols()
+        remove_low_data_symbols(vacuum='--vacuum' in sys.argv)
         print("Done!")
 
@@ -3,7 +3,9 @@ Remove low-volume REITs (Real Estate Investment Trusts) from the database.
 REITs often behave like bonds and have extremely low volatility/volume.
 Remove those with <4M daily volume.
 """
-from database import get_connection, get_symbols_with_data
+from database import get_connection, get_symbols_with_data, find_symbols_with_data, remove_symbols
+from typing import Dict, List
+import sys
 
 # List of REITs to check (will remove if <4M daily volume)
 REIT_SYMBOLS = [
@@ -12,10 +14,32 @@ REIT_SYMBOLS = [
     'PINE', 'RITM', 'STWD'
 ]
 
-# Normalize to uppercase set for fast lookup
-REIT_SYMBOLS_SET = {s.upper() for s in REIT_SYMBOLS}
+# Normalize to an uppercase frozenset of interned strings for fast lookup
+REIT_SYMBOLS_SET = frozenset(sys.intern(s.upper()) for s in REIT_SYMBOLS)
 
-def remove_low_volume_reits():
+# REITs whose latest-day volume is below this are removed
+VOLUME_THRESHOLD = 4_000_000  # 4M shares
+
+def latest_day_volumes(cursor, symbols: List[str]) -> Dict[str, int]:
+    """Latest trading day's total 1Min volume for each symbol, in one query"""
+    # Days are integer UTC buckets: timestamp / 86400 groups the same days as
+    # DATE(timestamp, 'unixepoch') without a date function call per row
+    placeholders = ','.join('?' * len(symbols))
+    cursor.execute(f'''
+        SELECT symbol, daily_volume FROM (
+            SELECT symbol, SUM(volume) AS daily_volume,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY symbol ORDER BY timestamp / 86400 DESC
+                   ) AS rn
+            FROM bars
+            WHERE timeframe = '1Min' AND symbol IN ({placeholders})
+            GROUP BY symbol, timestamp / 86400
+        )
+        WHERE rn = 1
+    ''', symbols)
+    return {row[0]: row[1] for row in cursor.fetchall()}
+
+def remove_low_volume_reits(vacuum: bool = False):
     """Remove REITs with low volume (<4M daily) from database"""
     conn = get_connection()
     cursor = conn.cursor()
@@ -34,8 +58,8 @@ def remove_low_volume_reits():
     symbols = get_symbols_with_data('1Min')
     print(f"\nFound {len(symbols)} symbols in database")
     
-    # Find REITs in database
-    reits_in_db = [s for s in symbols if s.upper() in REIT_SYMBOLS_SET]
+    # Find REITs in database (joined in SQL against a temp table of candidates)
+    reits_in_db = find_symbols_with_data(REIT_SYMBOLS_SET, '1Min', conn=conn)
     
     print(f"\nREIT symbols found: {len(reits_in_db)}")
     
@@ -45,7 +69,6 @@ def remove_low_volume_reits():
         return
     
     # Check volume and decide which to remove
-    volume_threshold = 4_000_000  # 4M shares
     reits_to_remove = []
     reits_to_keep = []
     
@@ -53,23 +76,13 @@ def remove_low_volume_reits():
     print("Checking daily volume (latest trading day)")
     print(f"{'='*80}\n")
     
+    # Latest trading day's total volume for every REIT in one query
+    latest_volume = latest_day_volumes(cursor, reits_in_db)
+    
     for symbol in sorted(reits_in_db):
-        # Get latest trading day's total volume
-        cursor.execute('''
-            SELECT SUM(volume) as daily_volume, COUNT(*) as bar_count,
-                   DATE(datetime(MIN(timestamp), 'unixepoch')) as date
-            FROM bars
-            WHERE symbol = ? AND timeframe = '1Min'
-            GROUP BY DATE(datetime(timestamp, 'unixepoch'))
-            ORDER BY date DESC
-            LIMIT 1
-        ''', (symbol,))
-        
-        row = cursor.fetchone()
-        if row and row[0]:
-            daily_volume = row[0] or 0
-            
-            if daily_volume < volume_threshold:
+        daily_volume = latest_volume.get(symbol) or 0
+        if daily_volume:
+            if daily_volume < VOLUME_THRESHOLD:
                 reits_to_remove.append((symbol, daily_volume))
                 print(f"  {symbol}: {daily_volume:>12,} volume - REMOVE")
             else:
@@ -90,16 +103,11 @@ def remove_low_volume_reits():
     print(f"Removing {len(reits_to_remove)} low-volume REITs")
     print(f"{'='*80}\n")
     
-    removed_count = 0
-    for symbol, volume in reits_to_remove:
-        cursor.execute('DELETE FROM bars WHERE symbol = ?', (symbol,))
-        removed_count += cursor.rowcount
-    
-    conn.commit()
+    removed_count, reclaimed = remove_symbols(conn, [symbol for symbol, _ in reits_to_remove], vacuum=vacuum)
     
-    # Get remaining count
-    cursor.execute('SELECT COUNT(DISTINCT symbol) FROM bars WHERE timeframe = "1Min"')
-    remaining_symbols = cursor.fetchone()[0]
+    # Remaining count from the symbol list already loaded, instead of a
+    # COUNT(DISTINCT symbol) scan over bars after the delete
+    remaining_symbols = len(symbols) - len(reits_to_remove)
     
     print(f"{'='*80}")
     print("REMOVAL COMPLETE")
@@ -110,6 +118,9 @@ def remove_low_volume_reits():
     print(f"Regular stocks remaining: {remaining_symbols}")
     print(f"{'='*80}\n")
     
+    if vacuum:
+        print(f"VACUUM reclaimed {reclaimed / 1024 / 1024:,.1f} MB\n")
+    
     conn.close()
 
 if __name__ == '__main__':
@@ -125,6 +136,6 @@ if __name__ == '__main__':
     if response != 'y':
         print("Cancelled.")
     else:
-        remove_low_volume_reits()
+        remove_low_volume_reits(vacuum='--vacuum' in sys.argv)
         print("Done!")
 
@@ -2,7 +2,8 @@
 Remove microcaps (<$200M market cap) with no/low volume from the database.
 These are tiny companies with minimal trading activity.
 """
-from database import get_connection, get_symbols_with_data
+from database import get_connection, get_symbols_with_data, find_symbols_with_data, remove_symbols
+import sys
 
 # List of microcaps to remove (examples provided)
 MICROCAP_SYMBOLS = [
@@ -10,10 +11,10 @@ MICROCAP_SYMBOLS = [
     'OPAD', 'SHCO', 'SOUL', 'STEM', 'TBI', 'VFRC', 'XIFR', 'YALA', 'ZVIA'
 ]
 
-# Normalize to uppercase set for fast lookup
-MICROCAP_SYMBOLS_SET = {s.upper() for s in MICROCAP_SYMBOLS}
+# Normalize to an uppercase frozenset of interned strings for fast lookup
+MICROCAP_SYMBOLS_SET = frozenset(sys.intern(s.upper()) for s in MICROCAP_SYMBOLS)
 
-def remove_microcaps():
+def remove_microcaps(vacuum: bool = False):
     """Remove microcaps from database"""
     conn = get_connection()
     cursor = conn.cursor()
@@ -31,8 +32,8 @@ def remove_microcaps():
     symbols = get_symbols_with_data('1Min')
     print(f"\nFound {len(symbols)} symbols in database")
     
-    # Find microcaps in database
-    microcaps_in_db = [s for s in symbols if s.upper() in MICROCAP_SYMBOLS_SET]
+    # Find microcaps in database (joined in SQL against a temp table of candidates)
+    microcaps_in_db = find_symbols_with_data(MICROCAP_SYMBOLS_SET, '1Min', conn=conn)
     
     print(f"\nMicrocap symbols to remove: {len(microcaps_in_db)}")
     print(f"This represents {(len(microcaps_in_db)/len(symbols)*100):.1f}% of your database")
@@ -47,19 +48,25 @@ def remove_microcaps():
     print("Microcaps to remove:")
     print(f"{'='*80}\n")
     
-    for symbol in sorted(microcaps_in_db):
-        # Check volume for reference
-        cursor.execute('''
-            SELECT SUM(volume) as daily_volume
+    # Latest trading day's volume for every microcap in one query (for reference),
+    # with days bucketed as integer UTC days
+    placeholders = ','.join('?' * len(microcaps_in_db))
+    cursor.execute(f'''
+        SELECT symbol, daily_volume FROM (
+            SELECT symbol, SUM(volume) AS daily_volume,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY symbol ORDER BY timestamp / 86400 DESC
+                   ) AS rn
             FROM bars
-            WHERE symbol = ? AND timeframe = '1Min'
-            GROUP BY DATE(datetime(timestamp, 'unixepoch'))
-            ORDER BY DATE(datetime(timestamp, 'unixepoch')) DESC
-            LIMIT 1
-        ''', (symbol,))
-        
-        row = cursor.fetchone()
-        volume = row[0] if row and row[0] else 0
+            WHERE timeframe = '1Min' AND symbol IN ({placeholders})
+            GROUP BY symbol, timestamp / 86400
+        )
+        WHERE rn = 1
+    ''', microcaps_in_db)
+    latest_volume = {row[0]: row[1] for row in cursor.fetchall()}
+    
+    for symbol in sorted(microcaps_in_db):
+        volume = latest_volume.get(symbol) or 0
         volume_str = f"{volume:,}" if volume > 0 else "No volume"
         print(f"  {symbol}: {volume_str} daily volume")
     
@@ -68,16 +75,11 @@ def remove_microcaps():
     print(f"Removing {len(microcaps_in_db)} microcap symbols")
     print(f"{'='*80}\n")
     
-    removed_count = 0
-    for symbol in microcaps_in_db:
-        cursor.execute('DELETE FROM bars WHERE symbol = ?', (symbol,))
-        removed_count += cursor.rowcount
+    removed_count, reclaimed = remove_symbols(conn, microcaps_in_db, vacuum=vacuum)
     
-    conn.commit()
-    
-    # Get remaining count
-    cursor.execute('SELECT COUNT(DISTINCT symbol) FROM bars WHERE timeframe = "1Min"')
-    remaining_symbols = cursor.fetchone()[0]
+    # Remaining count from the symbol list already loaded, instead of a
+    # COUNT(DISTINCT symbol) scan over bars after the delete
+    remaining_symbols = len(symbols) - len(microcaps_in_db)
     
     print(f"{'='*80}")
     print("REMOVAL COMPLETE")
@@ -87,6 +89,9 @@ def remove_microcaps():
     print(f"Removed {len(microcaps_in_db)} microcaps ({(len(microcaps_in_db)/(len(microcaps_in_db)+remaining_symbols)*100):.1f}% of total)")
     print(f"{'='*80}\n")
     
+    if vacuum:
+        print(f"VACUUM reclaimed {reclaimed / 1024 / 1024:,.1f} MB\n")
+    
     conn.close()
 
 if __name__ == '__main__':
@@ -102,6 +107,6 @@ if __name__ == '__main__':
     if response != 'y':
         print("Cancelled.")
     else:
-        remove_microcaps()
+        remove_microcaps(vacuum='--vacuum' in sys.argv)
         print("Done!")
 
@@ -2,7 +2,8 @@
 Remove SPAC (Special Purpose Acquisition Company) remnants from the database.
 SPAC shells often have no liquidity or volume.
 """
-from database import get_connection, get_symbols_with_data
+from database import get_connection, get_symbols_with_data, find_symbols_with_data, remove_symbols
+import sys
 
 # List of SPAC remnants to remove
 SPAC_SYMBOLS = [
@@ -10,13 +11,12 @@ SPAC_SYMBOLS = [
     'RBOT', 'PERF', 'SHCO', 'YALA', 'ZVIA'
 ]
 
-# Normalize to uppercase set for fast lookup
-SPAC_SYMBOLS_SET = {s.upper() for s in SPAC_SYMBOLS}
+# Normalize to an uppercase frozenset of interned strings for fast lookup
+SPAC_SYMBOLS_SET = frozenset(sys.intern(s.upper()) for s in SPAC_SYMBOLS)
 
-def remove_spac_remnants():
+def remove_spac_remnants(vacuum: bool = False):
     """Remove SPAC remnants from database"""
     conn = get_connection()
-    cursor = conn.cursor()
     
     print("=" * 80)
     print("REMOVE SPAC REMNANTS")
@@ -30,8 +30,8 @@ def remove_spac_remnants():
     symbols = get_symbols_with_data('1Min')
     print(f"\nFound {len(symbols)} symbols in database")
     
-    # Find SPACs in database
-    spacs_in_db = [s for s in symbols if s.upper() in SPAC_SYMBOLS_SET]
+    # Find SPACs in database (joined in SQL against a temp table of candidates)
+    spacs_in_db = find_symbols_with_data(SPAC_SYMBOLS_SET, '1Min', conn=conn)
     
     print(f"\nSPAC remnant symbols to remove: {len(spacs_in_db)}")
     print(f"This represents {(len(spacs_in_db)/len(symbols)*100):.1f}% of your database")
@@ -52,16 +52,11 @@ def remove_spac_remnants():
     print(f"Removing {len(spacs_in_db)} SPAC remnant symbols")
     print(f"{'='*80}\n")
     
-    removed_count = 0
-    for symbol in spacs_in_db:
-        cursor.execute('DELETE FROM bars WHERE symbol = ?', (symbol,))
-        removed_count += cursor.rowcount
+    removed_count, reclaimed = remove_symbols(conn, spacs_in_db, vacuum=vacuum)
     
-    conn.commit()
-    
-    # Get remaining count
-    cursor.execute('SELECT COUNT(DISTINCT symbol) FROM bars WHERE timeframe = "1Min"')
-    remaining_symbols = cursor.fetchone()[0]
+    # Remaining count from the symbol list already loaded, instead of a
+    # COUNT(DISTINCT symbol) scan over bars after the delete
+    remaining_symbols = len(symbols) - len(spacs_in_db)
     
     print(f"{'='*80}")
     print("REMOVAL COMPLETE")
@@ -71,6 +66,9 @@ def remove_spac_remnants():
     print(f"Removed {len(spacs_in_db)} SPAC remnants ({(len(spacs_in_db)/(len(spacs_in_db)+remaining_symbols)*100):.1f}% of total)")
     print(f"{'='*80}\n")
     
+    if vacuum:
+        print(f"VACUUM reclaimed {reclaimed / 1024 / 1024:,.1f} MB\n")
+    
     conn.close()
 
 if __name__ == '__main__':
@@ -86,6 +84,6 @@ if __name__ == '__main__':
     if response != 'y':
         print("Cancelled.")
     else:
-        remove_spac_remnants()
+        remove_spac_remnants(vacuum='--vacuum' in sys.argv)
         print("Done!")
 
@@ -2,12 +2,52 @@
 Remove preferred shares, warrants, and units from database.
 These are often less liquid and harder to trade than regular stocks.
 """
-from database import get_connection, get_symbols_with_data
+from database import get_connection, get_symbols_with_data, remove_symbols
+from typing import Dict, List, Optional
+import re
+import sys
 
-def remove_special_symbols():
-    """Remove preferred shares (.PR*), warrants (.WS), and units (.U) from database"""
+# Same precedence as the SQL CASE below: any .WS, then any .U, then any other dot
+SPECIAL_SYMBOL_RE = re.compile(r'^(?:.*\.(WS)|.*\.(U)|.*\.)')
+
+def classify_symbol(symbol: str) -> Optional[str]:
+    """Return 'warrant', 'unit' or 'preferred' for a special symbol, None for a regular one"""
+    m = SPECIAL_SYMBOL_RE.match(symbol)
+    if m is None:
+        return None
+    if m.group(1):
+        return 'warrant'
+    return 'unit' if m.group(2) else 'preferred'
+
+def _classify_symbols_sql(conn, timeframe: str = '1Min') -> Dict[str, List[str]]:
+    """
+    Categorize special symbols with GLOB patterns inside SQLite and return
+    {'warrant': [...], 'unit': [...], 'preferred': [...]}. Regular symbols are
+    filtered out in the query. Precedence matches the old Python checks:
+    .WS, then .U, then any other dotted symbol (preferred shares).
+    """
+    categories = {'warrant': [], 'unit': [], 'preferred': []}
+    rows = conn.execute('''
+        SELECT symbol,
+               CASE
+                   WHEN symbol GLOB '*.WS*' THEN 'warrant'
+                   WHEN symbol GLOB '*.U*' THEN 'unit'
+                   ELSE 'preferred'
+               END
+        FROM (SELECT DISTINCT symbol FROM bars WHERE timeframe = ?)
+        WHERE symbol GLOB '*.*'
+        ORDER BY symbol
+    ''', (timeframe,))
+    for symbol, category in rows:
+        categories[category].append(symbol)
+    return categories
+
+def remove_special_symbols(vacuum: bool = False, dry_run: bool = False):
+    """
+    Remove preferred shares (.PR*), warrants (.WS), and units (.U) from database.
+    With dry_run, only print what would be removed.
+    """
     conn = get_connection()
-    cursor = conn.cursor()
     
     print("=" * 80)
     print("REMOVE SPECIAL SYMBOLS")
@@ -22,27 +62,17 @@ def remove_special_symbols():
     symbols = get_symbols_with_data('1Min')
     print(f"Found {len(symbols)} symbols in database\n")
     
-    # Categorize symbols
-    preferred_shares = []
-    warrants = []
-    units = []
-    regular_stocks = []
-    
-    for symbol in symbols:
-        if '.WS' in symbol:
-            warrants.append(symbol)
-        elif '.U' in symbol:
-            units.append(symbol)
-        elif '.' in symbol:
-            # Likely a preferred share (e.g., .PR*, .PRE, .PRA, etc.)
-            preferred_shares.append(symbol)
-        else:
-            regular_stocks.append(symbol)
+    # Categorize symbols in SQL; only special symbols come back to Python
+    categories = _classify_symbols_sql(conn)
+    preferred_shares = categories['preferred']
+    warrants = categories['warrant']
+    units = categories['unit']
+    regular_count = len(symbols) - len(preferred_shares) - len(warrants) - len(units)
     
     symbols_to_remove = preferred_shares + warrants + units
     
     print(f"Symbol breakdown:")
-    print(f"  Regular stocks: {len(regular_stocks)}")
+    print(f"  Regular stocks: {regular_count}")
     print(f"  Preferred shares: {len(preferred_shares)}")
     print(f"  Warrants: {len(warrants)}")
     print(f"  Units: {len(units)}")
@@ -54,7 +84,7 @@ def remove_special_symbols():
         return
     
     print(f"\n{'='*80}")
-    print(f"Removing {len(symbols_to_remove)} special symbols")
+    print(f"{'Would remove' if dry_run else 'Removing'} {len(symbols_to_remove)} special symbols")
     print(f"{'='*80}\n")
     
     # Show examples
@@ -72,21 +102,23 @@ def remove_special_symbols():
         print(f"\nUnits to remove ({len(units)}):")
         print(f"  {', '.join(units)}")
     
-    # Remove from database
-    removed_count = 0
-    for symbol in symbols_to_remove:
-        cursor.execute('DELETE FROM bars WHERE symbol = ?', (symbol,))
-        removed_count += cursor.rowcount
+    if dry_run:
+        print("\nDry run: nothing removed.")
+        conn.close()
+        return
     
-    conn.commit()
+    removed_count, reclaimed = remove_symbols(conn, symbols_to_remove, vacuum=vacuum)
     
     print(f"\n{'='*80}")
     print("REMOVAL COMPLETE")
     print(f"{'='*80}")
     print(f"Removed {removed_count:,} bar records for {len(symbols_to_remove)} symbols")
-    print(f"Regular stocks remaining: {len(regular_stocks)}")
+    print(f"Regular stocks remaining: {regular_count}")
     print(f"{'='*80}\n")
     
+    if vacuum:
+        print(f"VACUUM reclaimed {reclaimed / 1024 / 1024:,.1f} MB\n")
+    
     conn.close()
 
 if __name__ == '__main__':
@@ -98,10 +130,13 @@ if __name__ == '__main__':
     print("  - Warrants (.WS)")
     print("  - Units (.U)")
     
-    response = input("\nContinue? (y/n): ").strip().lower()
-    if response != 'y':
-        print("Cancelled.")
+    if '--dry-run' in sys.argv:
+        remove_special_symbols(dry_run=True)
     else:
-        remove_special_symbols()
-        print("Done!")
+        response = input("\nContinue? (y/n): ").strip().lower()
+        if response != 'y':
+            print("Cancelled.")
+        else:
+            remove_special_symbols(vacuum='--vacuum' in sys.argv)
+            print("Done!")
 
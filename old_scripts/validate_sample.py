@@ -1,16 +1,22 @@
 from __future__ import annotations
 
+import heapq
+import json
+import os
 import random
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from typing import Dict, Iterable, List, Optional, Tuple
 
-import requests
-import yaml
-
-from database import get_connection, get_symbols_with_data
+from alpaca_client import BASE_URL, FEED, SESSION, parse_bar_timestamp
+from database import db_cache_path, db_file_signature, ensure_bar_indexes, get_connection, get_symbols_with_data
+from rate_limit import data_limiter
 
+# Spot-check requests in flight at once; each one takes a token from
+# rate_limit.data_limiter, so the pool stays under Alpaca's request budget
+MAX_WORKERS = 8
 
 @dataclass
 class SampleResult:
@@ -22,48 +28,46 @@ class SampleResult:
     error: Optional[str] = None
 
 
-def load_keys() -> Tuple[str, str, str]:
-    with open("config.yml", "r") as f:
-        cfg = yaml.safe_load(f)
-    return cfg["alpaca"]["api_key"], cfg["alpaca"]["api_secret"], cfg["alpaca"]["data_url"]
-
-
 def iso_z(ts: datetime) -> str:
     return ts.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
 
 
-def fetch_bar_from_alpaca(symbol: str, when_unix: int, api_key: str, api_secret: str, base_url: str):
-    start_dt = datetime.fromtimestamp(when_unix, tz=timezone.utc)
-    end_dt = start_dt + timedelta(minutes=1)
-    url = f"{base_url}/stocks/{symbol}/bars"
-    resp = requests.get(
-        url,
-        headers={
-            "APCA-API-KEY-ID": api_key,
-            "APCA-API-SECRET-KEY": api_secret,
-        },
-        params={
-            "timeframe": "1Min",
-            "start": iso_z(start_dt),
-            "end": iso_z(end_dt),
-            "feed": "iex",
-            "limit": 1,
-        },
-        timeout=15,
-    )
-    resp.raise_for_status()
-    data = resp.json()
-    bars = data.get("bars", [])
-    return bars[0] if bars else None
-
-
-def get_recent_bars_for_symbol(symbol: str, days: int) -> List[Tuple[int, float, int]]:
+def fetch_bars_from_alpaca(symbol: str, start_unix: int, end_unix: int) -> Dict[int, dict]:
     """
-    Return (timestamp, close, volume) for last N days for a symbol.
+    Fetch every 1Min bar for a symbol in [start_unix, end_unix) with one wide
+    request (following next_page_token if the window spans several pages) and
+    return them keyed by bar start in Unix seconds. Goes through the shared
+    alpaca_client.SESSION, so auth, pooling and retries are configured there.
+    """
+    url = f"{BASE_URL}/stocks/{symbol}/bars"
+    params = {
+        "timeframe": "1Min",
+        "start": iso_z(datetime.fromtimestamp(start_unix, tz=timezone.utc)),
+        "end": iso_z(datetime.fromtimestamp(end_unix, tz=timezone.utc)),
+        # Same feed ingest stored, so SIP rows aren't compared against IEX bars
+        "feed": FEED,
+        "limit": 10000,
+    }
+    bars_by_ts: Dict[int, dict] = {}
+    while True:
+        data_limiter.acquire()
+        resp = SESSION.get(url, params=params, timeout=15)
+        resp.raise_for_status()
+        # Parse the raw bytes; skips building the decoded text copy of large pages
+        data = json.loads(resp.content)
+        for bar in data.get("bars") or []:
+            bars_by_ts[parse_bar_timestamp(bar["t"])] = bar
+        token = data.get("next_page_token")
+        if not token:
+            return bars_by_ts
+        params["page_token"] = token
+
+
+def _fetch_recent(cur, symbol: str, cutoff: int) -> List[Tuple[int, float, int]]:
+    """
+    Return (timestamp, close, volume) for a symbol's bars at or after cutoff,
+    using the caller's cursor so one connection serves the whole sampling loop.
     """
-    cutoff = int((datetime.now(tz=timezone.utc) - timedelta(days=days)).timestamp())
-    conn = get_connection()
-    cur = conn.cursor()
     cur.execute(
         """
         SELECT timestamp, close, volume
@@ -73,54 +77,131 @@ def get_recent_bars_for_symbol(symbol: str, days: int) -> List[Tuple[int, float,
         """,
         (symbol, cutoff),
     )
-    rows = [(int(r[0]), float(r[1]), int(r[2])) for r in cur.fetchall()]
-    conn.close()
-    return rows
+    # Column affinities already give int timestamps/volumes and float prices
+    return cur.fetchall()
+
 
+def select_quantile(values: List, q: float):
+    """
+    Return the value at index int(q * (n - 1)) of sorted(values) without a
+    full sort: heapq keeps only the shorter side of the split, so p90 of n
+    values costs O(n log(n/10)) rather than O(n log n).
+    """
+    idx = max(0, int(q * (len(values) - 1)))
+    above = len(values) - idx
+    if idx + 1 <= above:
+        return heapq.nsmallest(idx + 1, values)[-1]
+    return heapq.nlargest(above, values)[-1]
+
+
+class _Pct90Agg:
+    """SQLite aggregate: pct90(x) = select_quantile(values, 0.9) over the group."""
+
+    def __init__(self):
+        self.values: List[int] = []
+
+    def step(self, value):
+        self.values.append(value)
+
+    def finalize(self):
+        return select_quantile(self.values, 0.9) if self.values else 0
 
-def compute_day_expected_bars(days: int) -> Dict[datetime.date, int]:
+
+def window_start(days: int) -> int:
+    """Unix time of the UTC midnight starting the last-N-days window."""
+    cutoff = int((datetime.now(tz=timezone.utc) - timedelta(days=days)).timestamp())
+    return cutoff - cutoff % 86400
+
+
+def compute_day_expected_bars(days: int) -> Dict[int, int]:
     """
     For each date in the last N days, compute an 'expected bars per day' value
     as the 90th percentile of per-symbol bar counts in the DB for that date.
     This adapts to holidays/half-days without a market calendar.
+
+    Days are keyed by UTC day bucket (unix timestamp // 86400). Results are
+    cached as JSON in database.cache_dir(), one file per window length, keyed
+    like the symbol cache by the newest 1Min bar and db_file_signature(); a
+    write to the database or a new day's window makes the entry a miss.
     """
-    cutoff = int((datetime.now(tz=timezone.utc) - timedelta(days=days)).timestamp())
+    cutoff = window_start(days)
     conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
+    max_ts = conn.execute("SELECT MAX(timestamp) FROM bars WHERE timeframe = '1Min'").fetchone()[0]
+    cache_key = repr((cutoff, max_ts, db_file_signature()))
+    try:
+        cache_path = db_cache_path("day_expected", str(days))
+        with open(cache_path, "r") as f:
+            cached = json.load(f)
+        if cached["key"] == cache_key:
+            conn.close()
+            # JSON object keys are strings; day buckets are ints
+            return {int(day): count for day, count in cached["day_expected"].items()}
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        pass
+
+    conn.create_aggregate("pct90", 1, _Pct90Agg)
+    # Count per (symbol, UTC day), then take the per-day percentile in the same
+    # query; only one row per day crosses into Python
+    cur = conn.execute(
         """
-        SELECT symbol, timestamp
-        FROM bars
-        WHERE timeframe = '1Min' AND timestamp >= ?
+        SELECT day_bucket, pct90(cnt)
+        FROM (
+            SELECT timestamp / 86400 AS day_bucket, COUNT(*) AS cnt
+            FROM bars
+            WHERE timeframe = '1Min' AND timestamp >= ?
+            GROUP BY symbol, day_bucket
+        )
+        GROUP BY day_bucket
         """,
         (cutoff,),
     )
-    per_symbol_per_day: Dict[Tuple[str, datetime.date], int] = defaultdict(int)
-    for sym, ts in cur.fetchall():
-        d = datetime.fromtimestamp(int(ts), tz=timezone.utc).date()
-        per_symbol_per_day[(sym, d)] += 1
+    day_expected = dict(cur.fetchall())
     conn.close()
 
-    # Aggregate per day
-    per_day_counts: Dict[datetime.date, List[int]] = defaultdict(list)
-    for (sym, d), cnt in per_symbol_per_day.items():
-        per_day_counts[d].append(cnt)
-
-    def pct90(values: List[int]) -> int:
-        if not values:
-            return 0
-        values = sorted(values)
-        idx = max(0, int(0.9 * (len(values) - 1)))
-        return values[idx]
-
-    return {d: pct90(cnts) for d, cnts in per_day_counts.items()}
+    try:
+        cache_path = db_cache_path("day_expected", str(days))
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"key": cache_key, "day_expected": day_expected}, f)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+    return day_expected
 
 
 def sample_symbols(symbols: List[str], k: int) -> List[str]:
     if k >= len(symbols):
         return symbols
-    random.seed(42)
-    return random.sample(symbols, k)
+    return random.Random(42).sample(symbols, k)
+
+
+def check_symbol(symbol: str, picks: List[Tuple[int, float]]) -> List[SampleResult]:
+    """
+    Compare a symbol's sampled local closes against Alpaca, fetching all of
+    its picked minutes with a single request spanning first..last pick.
+    """
+    try:
+        first = min(ts for ts, _ in picks)
+        last = max(ts for ts, _ in picks)
+        remote = fetch_bars_from_alpaca(symbol, first, last + 60)
+    except Exception as e:
+        return [
+            SampleResult(symbol=symbol, ts_unix=ts, local_close=close, api_close=None, ok=False, error=str(e))
+            for ts, close in picks
+        ]
+
+    results: List[SampleResult] = []
+    for ts, close in picks:
+        bar = remote.get(ts)
+        if not bar:
+            results.append(
+                SampleResult(symbol=symbol, ts_unix=ts, local_close=close, api_close=None, ok=False, error="no_bar")
+            )
+            continue
+        api_close = float(bar["c"])
+        ok = abs(api_close - close) <= 0.01
+        results.append(SampleResult(symbol=symbol, ts_unix=ts, local_close=close, api_close=api_close, ok=ok))
+    return results
 
 
 def run_sampling(
@@ -128,23 +209,39 @@ def run_sampling(
     days: int = 14,
     per_symbol_minutes: int = 3,
     min_volume: int = 500,  # prefer meaningful prints
+    max_workers: int = MAX_WORKERS,
 ) -> Tuple[List[SampleResult], Dict[str, float]]:
-    api_key, api_secret, base_url = load_keys()
+    """
+    Compute per-symbol coverage from the DB, pick sample minutes, then check
+    each symbol's picks against Alpaca (one request per symbol) on a thread
+    pool. max_workers=1 runs the checks serially. Results keep the
+    symbol/pick order either way.
+    """
     day_expected = compute_day_expected_bars(days)
 
-    results: List[SampleResult] = []
+    checks: List[Tuple[str, List[Tuple[int, float]]]] = []
     coverage_by_symbol: Dict[str, float] = {}
 
+    # Same day-aligned window as day_expected, so first-day counts are comparable
+    cutoff = window_start(days)
+    conn = get_connection()
+    # Each _fetch_recent is a (symbol, timeframe, timestamp) index range seek
+    ensure_bar_indexes(conn)
+    cur = conn.cursor()
+    # One seeded stream for all symbols: reproducible, without reusing the same
+    # draw for every symbol or touching the global random state
+    rng = random.Random(1337)
+
     for sym in symbols:
-        rows = get_recent_bars_for_symbol(sym, days)
+        rows = _fetch_recent(cur, sym, cutoff)
         if not rows:
             coverage_by_symbol[sym] = 0.0
             continue
 
         # Coverage ratio: sum of min(day_count, expected)/sum(expected)
-        counts_per_day: Dict[datetime.date, int] = defaultdict(int)
+        counts_per_day: Dict[int, int] = defaultdict(int)
         for ts, _, _ in rows:
-            counts_per_day[datetime.fromtimestamp(ts, tz=timezone.utc).date()] += 1
+            counts_per_day[ts // 86400] += 1
 
         cov_num = 0
         cov_den = 0
@@ -159,32 +256,32 @@ def run_sampling(
         # Prefer higher-volume minutes for API checks
         hv = [r for r in rows if r[2] >= min_volume]
         pool = hv if len(hv) >= per_symbol_minutes else rows
-        random.seed(1337)
-        picks = random.sample(pool, k=min(per_symbol_minutes, len(pool)))
-
-        for ts, close, _ in picks:
-            try:
-                bar = fetch_bar_from_alpaca(sym, ts, api_key, api_secret, base_url)
-                if not bar:
-                    results.append(
-                        SampleResult(symbol=sym, ts_unix=ts, local_close=close, api_close=None, ok=False, error="no_bar")
-                    )
-                    continue
-                api_close = float(bar["c"])
-                ok = abs(api_close - close) <= 0.01
-                results.append(
-                    SampleResult(symbol=sym, ts_unix=ts, local_close=close, api_close=api_close, ok=ok)
-                )
-            except Exception as e:
-                results.append(
-                    SampleResult(
-                        symbol=sym, ts_unix=ts, local_close=close, api_close=None, ok=False, error=str(e)
-                    )
-                )
+        picks = rng.sample(pool, k=min(per_symbol_minutes, len(pool)))
+
+        checks.append((sym, [(ts, close) for ts, close, _ in picks]))
+
+    conn.close()
+
+    # Network-bound; threads overlap the round-trips while data_limiter paces them
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        per_symbol = list(executor.map(lambda check: check_symbol(*check), checks))
+    results = [r for symbol_results in per_symbol for r in symbol_results]
 
     return results, coverage_by_symbol
 
 
+def interpolate_percentile(sorted_values: List[float], q: float) -> float:
+    """
+    Percentile of already-sorted values with linear interpolation between the
+    two nearest ranks (numpy.percentile's default), so several quantiles can
+    share one sort.
+    """
+    pos = q * (len(sorted_values) - 1)
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
 def summarize(results: List[SampleResult], coverage_by_symbol: Dict[str, float]):
     total = len(results)
     mismatches = sum(1 for r in results if not r.ok)
@@ -195,11 +292,11 @@ def summarize(results: List[SampleResult], coverage_by_symbol: Dict[str, float])
     print(f"Samples checked: {total}")
     print(f"Mismatches (incl. missing bars/API errors): {mismatches} ({mismatch_rate:.2f}%)")
 
-    cov_values = list(coverage_by_symbol.values())
+    cov_values = sorted(coverage_by_symbol.values())
     if cov_values:
         avg_cov = sum(cov_values) / len(cov_values)
-        p50 = sorted(cov_values)[len(cov_values) // 2]
-        p90 = sorted(cov_values)[int(0.9 * (len(cov_values) - 1))]
+        p50 = interpolate_percentile(cov_values, 0.5)
+        p90 = interpolate_percentile(cov_values, 0.9)
         print(f"Coverage ratio vs per-day expected (0–1): avg={avg_cov:.3f}, p50={p50:.3f}, p90={p90:.3f}")
 
     errs = [r for r in results if not r.ok]
@@ -218,6 +315,7 @@ def main():
     parser.add_argument("--symbols", type=int, default=50)
     parser.add_argument("--per-symbol-minutes", type=int, default=3)
     parser.add_argument("--min-volume", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Concurrent spot-check requests (1 = serial)")
     args = parser.parse_args()
 
     syms = get_symbols_with_data("1Min")
@@ -229,7 +327,8 @@ def main():
     print(f"Sampling {len(sampled)} symbols out of {len(syms)} with {args.per_symbol_minutes} minutes each...")
 
     results, cov = run_sampling(
-        sampled, days=args.days, per_symbol_minutes=args.per_symbol_minutes, min_volume=args.min_volume
+        sampled, days=args.days, per_symbol_minutes=args.per_symbol_minutes, min_volume=args.min_volume,
+        max_workers=args.workers,
     )
     summarize(results, cov)
 
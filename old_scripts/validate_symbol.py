@@ -5,80 +5,40 @@ import sys
 from datetime import datetime, timedelta, timezone
 from typing import List, Tuple
 
-import requests
-import yaml
+from alpaca_client import FEED
+from database import ensure_bar_indexes, get_connection
+from validate_sample import fetch_bars_from_alpaca
 
-from database import get_connection
 
-
-def load_keys() -> Tuple[str, str, str]:
-    with open("config.yml", "r") as f:
-        cfg = yaml.safe_load(f)
-    return (
-        cfg["alpaca"]["api_key"],
-        cfg["alpaca"]["api_secret"],
-        cfg["alpaca"]["data_url"],
-    )
-
-
-def iso_z(ts: datetime) -> str:
-    # Return RFC3339 UTC with Z
-    return ts.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
-
-
-def fetch_bar_from_alpaca(symbol: str, when_unix: int, api_key: str, api_secret: str, base_url: str):
-    start_dt = datetime.fromtimestamp(when_unix, tz=timezone.utc)
-    end_dt = start_dt + timedelta(minutes=1)
-    url = f"{base_url}/stocks/{symbol}/bars"
-    resp = requests.get(
-        url,
-        headers={
-            "APCA-API-KEY-ID": api_key,
-            "APCA-API-SECRET-KEY": api_secret,
-        },
-        params={
-            "timeframe": "1Min",
-            "start": iso_z(start_dt),
-            "end": iso_z(end_dt),
-            "feed": "iex",
-            "limit": 1,
-        },
-        timeout=15,
-    )
-    resp.raise_for_status()
-    data = resp.json()
-    bars = data.get("bars", [])
-    return bars[0] if bars else None
-
-
-def load_local_bars(symbol: str, days: int) -> List[Tuple[int, float, float, float, float, int]]:
-    cutoff = int((datetime.now(tz=timezone.utc) - timedelta(days=days)).timestamp())
-    conn = get_connection()
-    cur = conn.cursor()
+def load_close_volume(cur, symbol: str, cutoff: int) -> List[Tuple[int, float, int]]:
+    """
+    Return (timestamp, close, volume) for a symbol's 1Min bars at or after
+    cutoff. Spot checks and per-day counts need nothing else, so OHLC is not read.
+    """
     cur.execute(
         """
-        SELECT timestamp, open, high, low, close, volume
+        SELECT timestamp, close, volume
         FROM bars
         WHERE symbol = ? AND timeframe = '1Min' AND timestamp >= ?
         ORDER BY timestamp ASC
         """,
         (symbol, cutoff),
     )
-    rows = [(int(r[0]), float(r[1]), float(r[2]), float(r[3]), float(r[4]), int(r[5])) for r in cur.fetchall()]
-    conn.close()
-    return rows
+    # Column affinities already give int timestamps/volumes and float prices
+    return cur.fetchall()
 
 
-def summarize_per_day(rows: List[Tuple[int, float, float, float, float, int]]):
+def summarize_per_day(rows: List[Tuple[int, float, int]]):
     from collections import defaultdict
 
+    # Bucket by UTC day with integer math; dates are only built for display
     per_day = defaultdict(int)
     for ts, *_ in rows:
-        day = datetime.fromtimestamp(ts, tz=timezone.utc).date()
-        per_day[day] += 1
+        per_day[ts // 86400] += 1
     print("\nPer-day 1Min bar counts (last window):")
-    for day in sorted(per_day):
-        print(f"  {day}  ->  {per_day[day]} bars")
+    for bucket in sorted(per_day):
+        day = datetime.fromtimestamp(bucket * 86400, tz=timezone.utc).date()
+        print(f"  {day}  ->  {per_day[bucket]} bars")
 
 
 def main():
@@ -88,7 +48,12 @@ def main():
 
     print(f"Validating {symbol} over last {days} days with {samples} random spot-checks...\n")
 
-    local_rows = load_local_bars(symbol, days)
+    cutoff = int((datetime.now(tz=timezone.utc) - timedelta(days=days)).timestamp())
+    conn = get_connection()
+    # The lookup is a (symbol, timeframe, timestamp) index range seek
+    ensure_bar_indexes(conn)
+    local_rows = load_close_volume(conn.cursor(), symbol, cutoff)
+    conn.close()
     if not local_rows:
         print("No local bars found.")
         sys.exit(1)
@@ -99,25 +64,31 @@ def main():
     print(f"Local range: {first_ts}  ->  {last_ts}")
     summarize_per_day(local_rows)
 
-    api_key, api_secret, base_url = load_keys()
-
-    print("\nSpot checks vs Alpaca IEX:")
-    random.seed(42)
-    candidates = [row for row in local_rows if 14_000 < row[5]]  # prefer non-tiny volume bars
+    print(f"\nSpot checks vs Alpaca {FEED.upper()}:")
+    rng = random.Random(42)
+    candidates = [row for row in local_rows if 14_000 < row[2]]  # prefer non-tiny volume bars
     if len(candidates) < samples:
         candidates = local_rows
-    picks = random.sample(candidates, k=min(samples, len(candidates)))
+    picks = rng.sample(candidates, k=min(samples, len(candidates)))
+
+    # One request covering first..last pick instead of one per sampled minute
+    error = None
+    try:
+        first = min(row[0] for row in picks)
+        last = max(row[0] for row in picks)
+        remote_bars = fetch_bars_from_alpaca(symbol, first, last + 60)
+    except Exception as e:
+        remote_bars, error = {}, e
 
     mismatches = 0
-    for ts, o, h, l, c, v in picks:
+    for ts, c, v in picks:
         dt = datetime.fromtimestamp(ts, tz=timezone.utc)
-        try:
-            remote = fetch_bar_from_alpaca(symbol, ts, api_key, api_secret, base_url)
-        except Exception as e:
-            print(f"  {dt}Z  local close={c}  -> API error: {e}")
+        if error is not None:
+            print(f"  {dt}Z  local close={c}  -> API error: {error}")
             mismatches += 1
             continue
 
+        remote = remote_bars.get(ts)
         if not remote:
             print(f"  {dt}Z  local close={c}  -> API returned no bar")
             mismatches += 1
@@ -0,0 +1,97 @@
+"""
+Console progress reporting for long-running ingest loops.
+
+Status lines are buffered and written to stdout at most once per `interval`
+seconds instead of flushing a print() for every symbol.
+"""
+import sys
+import time
+from typing import List, Optional, TextIO
+
+
+class Progress:
+    """Track completed items and emit buffered status lines with rate/ETA."""
+
+    def __init__(self, total: int, desc: str = '', interval: float = 1.0,
+                 stream: Optional[TextIO] = None):
+        self.total = total
+        self.desc = desc
+        self.interval = interval
+        self.stream = stream or sys.stdout
+        self.count = 0
+        self.start_time = time.time()
+        self._last_flush = self.start_time
+        self._lines: List[str] = []
+        self._status: Optional[str] = None
+
+    @property
+    def elapsed(self) -> float:
+        return time.time() - self.start_time
+
+    @property
+    def rate(self) -> float:
+        """Items completed per second"""
+        elapsed = self.elapsed
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> float:
+        """Estimated seconds remaining"""
+        rate = self.rate
+        return (self.total - self.count) / rate if rate > 0 else 0.0
+
+    def prefix(self) -> str:
+        """Return a '[desc] [i/N] (p%)' prefix for the current position"""
+        percent = (self.count / self.total) * 100 if self.total else 100.0
+        head = f"[{self.desc}] " if self.desc else ''
+        return f"{head}[{self.count}/{self.total}] ({percent:.1f}%)"
+
+    def update(self, n: int = 1, line: Optional[str] = None):
+        """Advance by n items, optionally queueing a status line"""
+        self.count += n
+        if line is not None:
+            self._lines.append(line)
+        self._maybe_flush()
+
+    def write(self, line: str):
+        """Queue a full line of output"""
+        self._lines.append(line)
+        self._maybe_flush()
+
+    def status(self, line: str):
+        """Set a single overwritable status line (rendered with a carriage return)"""
+        self._status = line
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if time.time() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        """Write any buffered output now"""
+        parts = []
+        if self._lines:
+            parts.append('\n'.join(self._lines) + '\n')
+            self._lines.clear()
+        if self._status is not None:
+            parts.append(f"{self._status}\r")
+            self._status = None
+        if parts:
+            self.stream.write(''.join(parts))
+        self.stream.flush()
+        self._last_flush = time.time()
+
+    def close(self):
+        """Flush remaining output; a pending status line is terminated with a newline"""
+        if self._status is not None:
+            self._lines.append(self._status)
+            self._status = None
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
@@ -0,0 +1,47 @@
+"""
+Thread-safe token bucket for pacing Alpaca API requests.
+
+Callers acquire() a token before each request. The call only sleeps when the
+bucket is empty, so requests run back-to-back until the configured rate is
+reached and concurrent workers share a single budget.
+
+trading_limiter and data_limiter are process-wide buckets for the trading and
+market-data APIs; fetch helpers acquire them per HTTP request so scripts never
+need their own sleeps.
+"""
+import threading
+import time
+
+# Alpaca's documented request budget
+ALPACA_REQUESTS_PER_MINUTE = 200
+# Market data budget, kept a little under the limit for headroom
+ALPACA_DATA_REQUESTS_PER_MINUTE = 190
+
+
+class TokenBucket:
+    """Bucket refilled continuously at `rate_per_sec` tokens, holding at most `burst`."""
+
+    def __init__(self, rate_per_sec: float, burst: int = 1):
+        self.rate = rate_per_sec
+        self.capacity = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping only until one becomes available"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# Shared per-process budgets
+trading_limiter = TokenBucket(ALPACA_REQUESTS_PER_MINUTE / 60, burst=16)
+data_limiter = TokenBucket(ALPACA_DATA_REQUESTS_PER_MINUTE / 60, burst=16)